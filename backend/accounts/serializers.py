@@ -1,15 +1,21 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from courses.images import srcset
 
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
+    avatar_srcset = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'bio', 'interests')
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'avatar', 'avatar_srcset', 'bio', 'interests')
         read_only_fields = ('id',)
 
+    def get_avatar_srcset(self, obj):
+        return srcset(getattr(obj, 'avatar_variants', None), self.context.get('request'))
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
     password2 = serializers.CharField(write_only=True, required=True)
@@ -2,42 +2,54 @@ import json
 from typing import List, Dict, Any
 from django.conf import settings
 from courses.models import Course, CourseView
+from courses.candidates import candidate_lines, retrieve_candidates
+from courses.content_index import similar_courses
+from courses.llm import chat_completion
+from courses.recommender import recommend_courses
 
-try:
-    import openai
-    if settings.OPENAI_ENABLED and settings.OPENAI_API_KEY:
-        openai.api_key = settings.OPENAI_API_KEY
-        OPENAI_AVAILABLE = True
-    else:
-        OPENAI_AVAILABLE = False
-except ImportError:
-    OPENAI_AVAILABLE = False
+OPENAI_AVAILABLE = settings.OPENAI_ENABLED and bool(settings.OPENAI_API_KEY)
+
+# Views and submissions included in the recommendation prompt
+RECENT_HISTORY = 20
 
 def get_course_recommendations(user, test_submissions=None) -> List[Dict[str, Any]]:
     """
-    Get AI-powered course recommendations for a user.
-    If OpenAI is not available, return basic recommendations based on course views.
+    Get course recommendations for a user.
+    
+    Uses the precomputed item-item neighbors of the courses the user has
+    viewed or enrolled in. Users without usable history get AI-powered
+    recommendations if OpenAI is available, otherwise the courses closest in
+    content to the ones they viewed, or popular courses. The AI only reranks
+    a shortlist from retrieve_candidates(), trimmed to
+    RECOMMENDATION_PROMPT_TOKENS.
     """
+    neighbors = recommend_courses(user, limit=5)
+    if neighbors:
+        titles = dict(Course.objects.filter(
+            id__in={source_id for _, _, source_id in neighbors}
+        ).values_list('id', 'title'))
+        return [{
+            'course_id': course.id,
+            'title': course.title,
+            'description': course.description,
+            'confidence': round(0.5 + 0.4 * score, 2),
+            'reason': f"Students who took {titles.get(source_id, 'your courses')} also took this"
+        } for course, score, source_id in neighbors]
+
     if not OPENAI_AVAILABLE:
         # Fallback to basic recommendations based on course views
-        viewed_courses = CourseView.objects.filter(user=user).select_related('course')
-        if viewed_courses.exists():
-            # Get courses in the same category as viewed courses
-            categories = set(view.course.category for view in viewed_courses)
-            recommended_courses = Course.objects.filter(
-                category__in=categories
-            ).exclude(
-                id__in=[view.course.id for view in viewed_courses]
-            )[:5]
-            
+        viewed_ids = list(CourseView.objects.filter(user=user).values_list('course_id', flat=True))
+        similar = similar_courses(viewed_ids, limit=5) if viewed_ids else []
+        if similar:
+            # Courses closest in content to the ones the user viewed
             return [{
                 'course_id': course.id,
                 'title': course.title,
                 'description': course.description,
-                'confidence': 0.7,  # Default confidence for basic recommendations
-                'reason': 'Based on your viewing history'
-            } for course in recommended_courses]
-        
+                'confidence': round(0.5 + 0.3 * min(score / len(viewed_ids), 1.0), 2),
+                'reason': 'Similar to courses you viewed'
+            } for course, score in similar]
+
         # If no viewed courses, return popular courses
         popular_courses = Course.objects.order_by('-views_count')[:5]
         return [{
@@ -48,10 +60,11 @@ def get_course_recommendations(user, test_submissions=None) -> List[Dict[str, An
             'reason': 'Popular among other students'
         } for course in popular_courses]
 
-    # OpenAI-based recommendations
+    # OpenAI-based recommendations: local signals pick a shortlist, the model reranks it
+    candidates = retrieve_candidates(user)
     try:
-        # Get user's course history
-        viewed_courses = CourseView.objects.filter(user=user).select_related('course')
+        # Get user's most recent course history
+        viewed_courses = CourseView.objects.filter(user=user).select_related('course').order_by('-viewed_at')[:RECENT_HISTORY]
         course_history = [
             {
                 'title': view.course.title,
@@ -70,32 +83,52 @@ def get_course_recommendations(user, test_submissions=None) -> List[Dict[str, An
                     'score': submission.score,
                     'status': submission.status
                 }
-                for submission in test_submissions
+                for submission in test_submissions.order_by('-submitted_at')[:RECENT_HISTORY]
             ]
 
         # Prepare context for OpenAI
         context = {
             'course_history': course_history,
             'test_history': test_history,
-            'available_courses': list(Course.objects.values('id', 'title', 'category', 'description'))
         }
+        prompt = (
+            f"Based on this user data: {json.dumps(context)}, recommend the 5 best courses for them "
+            "from the candidates below (one JSON object per line). Reply with a JSON list of objects "
+            "with course_id, title, description, confidence (0-1) and reason.\n"
+        )
+        lines = candidate_lines(candidates, settings.RECOMMENDATION_PROMPT_TOKENS, prompt)
+        if not lines:
+            return _candidate_recommendations(candidates)
 
         # Call OpenAI API
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are a course recommendation assistant."},
-                {"role": "user", "content": f"Based on this user data: {json.dumps(context)}, recommend 5 courses."}
+                {"role": "user", "content": prompt + "\n".join(lines)}
             ]
         )
 
-        # Parse recommendations
-        recommendations = json.loads(response.choices[0].message.content)
-        return recommendations
+        # Parse recommendations, keeping only courses that were offered
+        offered = {course.id for course, _ in candidates[:len(lines)]}
+        recommendations = [
+            recommendation for recommendation in json.loads(response)
+            if recommendation.get('course_id') in offered
+        ]
+        return recommendations or _candidate_recommendations(candidates)
 
     except Exception as e:
-        # Fallback to basic recommendations if OpenAI fails
-        return get_course_recommendations(user)  # This will use the fallback logic
+        # Fall back to the local ranking if OpenAI fails
+        print(f"Error generating recommendations: {str(e)}")
+        return _candidate_recommendations(candidates)
+
+def _candidate_recommendations(candidates):
+    return [{
+        'course_id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'confidence': round(0.5 + 0.3 * score, 2),
+        'reason': 'Based on your activity'
+    } for course, score in candidates[:5]]
 
 def update_user_interests(user, course_data: Dict[str, Any]):
     """
@@ -114,9 +147,8 @@ def update_user_interests(user, course_data: Dict[str, Any]):
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are an interest extraction system."},
                 {"role": "user", "content": prompt}
             ],
@@ -125,7 +157,7 @@ def update_user_interests(user, course_data: Dict[str, Any]):
         )
         
         # Parse the response and update user interests
-        new_interests = response.choices[0].message.content.split(',')
+        new_interests = response.split(',')
         user.interests.extend(new_interests)
         user.save()
         
@@ -1,11 +1,9 @@
-from django.conf import settings
-import openai
 from typing import Dict, Any, List
 from django.contrib.auth import get_user_model
 from courses.models import Course
 import json
+from courses.llm import chat_completion
 
-openai.api_key = settings.OPENAI_API_KEY
 User = get_user_model()
 
 def get_user_context(user: User) -> Dict[str, Any]:
@@ -83,9 +81,8 @@ def process_chat_message(message: str, user: User = None) -> Dict[str, Any]:
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        ai_response = chat_completion(
+            [
                 {"role": "system", "content": "You are a helpful educational assistant."},
                 {"role": "user", "content": prompt}
             ],
@@ -93,8 +90,6 @@ def process_chat_message(message: str, user: User = None) -> Dict[str, Any]:
             max_tokens=500
         )
         
-        ai_response = response.choices[0].message.content
-        
         # Check for technical issues
         technical_keywords = ['error', 'problem', 'issue', 'bug', 'not working', 'broken']
         is_technical_issue = any(keyword in message.lower() for keyword in technical_keywords)
@@ -130,9 +125,8 @@ def get_troubleshooting_steps(issue_type: str) -> List[str]:
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are a technical support expert."},
                 {"role": "user", "content": prompt}
             ],
@@ -140,7 +134,7 @@ def get_troubleshooting_steps(issue_type: str) -> List[str]:
             max_tokens=300
         )
         
-        return response.choices[0].message.content.split('\n')
+        return response.split('\n')
         
     except Exception as e:
         return ["Please try refreshing the page or clearing your browser cache."] 
\ No newline at end of file
@@ -129,8 +129,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10,
+    'DEFAULT_PAGINATION_CLASS': 'courses.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
 }
 
 # JWT settings
@@ -151,4 +151,130 @@ EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
-EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '') 
\ No newline at end of file
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '') 
+# Course view counting
+# Detail views are buffered in memory and written in bulk every
+# COURSE_VIEW_FLUSH_INTERVAL seconds. A worker that dies without a clean
+# shutdown loses at most COURSE_VIEW_BUFFER_MAX_PENDING views.
+COURSE_VIEW_FLUSH_INTERVAL = int(os.getenv('COURSE_VIEW_FLUSH_INTERVAL', 10))
+COURSE_VIEW_BUFFER_MAX_PENDING = int(os.getenv('COURSE_VIEW_BUFFER_MAX_PENDING', 1000))
+
+# Cache
+# Shared Redis cache when REDIS_URL is set (required when running several
+# workers, since cached version stamps must agree); per-process memory otherwise.
+REDIS_URL = os.getenv('REDIS_URL', '')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Background tasks
+# Size of the per-process thread pool used for work that must not block a
+# request (image variants and similar).
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 4))
+# Test submissions are graded on their own pool in the web process rather
+# than by Celery: celery is pinned in the top-level requirements.txt, but no
+# Celery app, broker settings or worker service exist, and the backend image
+# installs backend/requirements.txt. Submissions left pending by a restart
+# are picked up by `manage.py grade_pending_submissions`.
+GRADING_WORKERS = int(os.getenv('GRADING_WORKERS', 4))
+# AI evaluation of individual answers runs concurrently, at most
+# EVALUATION_WORKERS calls at a time per process. Answers not evaluated
+# within GRADING_DEADLINE seconds leave the submission partially graded.
+EVALUATION_WORKERS = int(os.getenv('EVALUATION_WORKERS', 8))
+GRADING_CALL_TIMEOUT = int(os.getenv('GRADING_CALL_TIMEOUT', 30))
+GRADING_DEADLINE = int(os.getenv('GRADING_DEADLINE', 90))
+# Grading runs a submission gets; `manage.py grade_pending_submissions`
+# retries partially graded ones until they have had this many.
+GRADING_MAX_ATTEMPTS = int(os.getenv('GRADING_MAX_ATTEMPTS', 3))
+# Compiled answer keys are cached per test version, in the shared cache
+# and in a small per-process LRU.
+ANSWER_KEY_CACHE_TIMEOUT = int(os.getenv('ANSWER_KEY_CACHE_TIMEOUT', 24 * 60 * 60))
+ANSWER_KEY_LOCAL_CACHE_SIZE = int(os.getenv('ANSWER_KEY_LOCAL_CACHE_SIZE', 256))
+# Rendered test payloads (questions and choices) are cached per test version.
+TEST_PAYLOAD_CACHE_TIMEOUT = int(os.getenv('TEST_PAYLOAD_CACHE_TIMEOUT', 24 * 60 * 60))
+# Budget for the per-question feedback included in the AI overall feedback prompt
+OVERALL_FEEDBACK_PROMPT_CHARS = int(os.getenv('OVERALL_FEEDBACK_PROMPT_CHARS', 4000))
+
+# Recommendations
+# Similar courses kept per course by `manage.py build_course_neighbors`,
+# which should run periodically (e.g. nightly from cron).
+RECOMMENDER_NEIGHBORS = int(os.getenv('RECOMMENDER_NEIGHBORS', 20))
+# Seconds a worker reuses its copy of the course content index before
+# re-reading it from the cache. Course edits are collected for
+# CONTENT_INDEX_UPDATE_DELAY seconds and applied to the index in one batch;
+# `manage.py build_content_index` rebuilds it from scratch (run it
+# periodically, e.g. nightly, to pick up new vocabulary).
+CONTENT_INDEX_RELOAD = int(os.getenv('CONTENT_INDEX_RELOAD', 60))
+CONTENT_INDEX_UPDATE_DELAY = float(os.getenv('CONTENT_INDEX_UPDATE_DELAY', 5))
+# Recommendations are cached per user until they view a new course, enroll,
+# submit a test or the catalog changes; a stale result is served while a
+# background task recomputes it. Unused entries expire after
+# RECOMMENDATION_CACHE_TIMEOUT seconds.
+RECOMMENDATION_CACHE_TIMEOUT = int(os.getenv('RECOMMENDATION_CACHE_TIMEOUT', 24 * 60 * 60))
+# Longest a background refresh is expected to take (it may call the LLM);
+# another refresh of the same user is not started before then.
+RECOMMENDATION_REFRESH_TIMEOUT = int(os.getenv('RECOMMENDATION_REFRESH_TIMEOUT', 120))
+# AI recommendations rerank a shortlist of RECOMMENDATION_CANDIDATES courses
+# picked by local signals, trimmed so the prompt stays within an estimated
+# RECOMMENDATION_PROMPT_TOKENS tokens.
+RECOMMENDATION_CANDIDATES = int(os.getenv('RECOMMENDATION_CANDIDATES', 20))
+RECOMMENDATION_PROMPT_TOKENS = int(os.getenv('RECOMMENDATION_PROMPT_TOKENS', 2000))
+
+# OpenAI
+# All OpenAI calls go through courses.llm, over one pooled client per worker
+# process. OPENAI_BASE_URL points it at another endpoint, e.g. a local fake
+# server. Each attempt gets LLM_CALL_TIMEOUT seconds and a call, retries
+# included, LLM_REQUEST_DEADLINE seconds. Failed attempts are retried up to
+# LLM_MAX_RETRIES times with jittered backoff, and retries are capped at
+# LLM_RETRY_BUDGET_RATIO of calls (at most LLM_RETRY_BUDGET_MAX saved up).
+# After LLM_BREAKER_THRESHOLD consecutive failures, calls fail fast to the
+# caller's fallback for LLM_BREAKER_RESET seconds.
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+LLM_CALL_TIMEOUT = int(os.getenv('LLM_CALL_TIMEOUT', 10))
+LLM_REQUEST_DEADLINE = int(os.getenv('LLM_REQUEST_DEADLINE', 30))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', 0.5))
+LLM_BACKOFF_CAP = float(os.getenv('LLM_BACKOFF_CAP', 4))
+LLM_RETRY_BUDGET_RATIO = float(os.getenv('LLM_RETRY_BUDGET_RATIO', 0.2))
+LLM_RETRY_BUDGET_MAX = int(os.getenv('LLM_RETRY_BUDGET_MAX', 10))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_RESET = int(os.getenv('LLM_BREAKER_RESET', 30))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', 20))
+# AI grades are cached by question and normalized answer text. Entries
+# expire after GRADE_CACHE_TIMEOUT seconds; beyond that the cache backend's
+# own eviction (Redis maxmemory-policy, LocMemCache MAX_ENTRIES) applies.
+# Hit and miss counts (`manage.py grade_cache_stats`) need REDIS_URL.
+GRADE_CACHE_TIMEOUT = int(os.getenv('GRADE_CACHE_TIMEOUT', 7 * 24 * 60 * 60))
+
+# Programming submissions run against their test cases in a pool of
+# SANDBOX_WORKERS pre-started Python processes, each run limited in CPU
+# time, wall time, memory, processes and output size. Workers run as
+# SANDBOX_USER, which must be a dedicated unprivileged account (not root and
+# not the account the application runs as), so the application must be
+# started as root or be able to switch to it. Each run is also put in its
+# own user, mount, network and PID namespaces; hosts or containers that
+# forbid unprivileged user namespaces (e.g. Docker's default seccomp profile)
+# cannot run programming answers: they are left unscored and the submission
+# partially graded, to be retried by `manage.py grade_pending_submissions`,
+# never scored zero. SANDBOX_PYTHON is the interpreter the
+# workers use (default: the application's own) and must be readable by
+# SANDBOX_USER. SANDBOX_MAX_PROCESSES caps the processes SANDBOX_USER may
+# have at once, workers included.
+SANDBOX_USER = os.getenv('SANDBOX_USER', 'nobody')
+SANDBOX_PYTHON = os.getenv('SANDBOX_PYTHON', '')
+SANDBOX_MAX_PROCESSES = int(os.getenv('SANDBOX_MAX_PROCESSES', 32))
+SANDBOX_WORKERS = int(os.getenv('SANDBOX_WORKERS', 2))
+SANDBOX_CPU_SECONDS = int(os.getenv('SANDBOX_CPU_SECONDS', 2))
+SANDBOX_WALL_SECONDS = int(os.getenv('SANDBOX_WALL_SECONDS', 5))
+SANDBOX_MEMORY_MB = int(os.getenv('SANDBOX_MEMORY_MB', 256))
+SANDBOX_OUTPUT_LIMIT = int(os.getenv('SANDBOX_OUTPUT_LIMIT', 64 * 1024))
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Course, Enrollment, Payment, Reward, ChatbotInteraction, CourseView, Test, Question, Choice, TestSubmission, QuestionSubmission, UserReward
+from .models import User, Course, Enrollment, Payment, Reward, ChatbotInteraction, CourseView, Test, Question, Choice, ProgrammingTestCase, TestSubmission, QuestionSubmission, UserReward, CourseViewBucket, PopularCourse, PopularityWindow, RegradeCheckpoint, PointsTransaction, PointsBalance, CoursePointsBalance, CourseNeighbor
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -30,6 +30,15 @@ admin.site.register(CourseView)
 admin.site.register(Test)
 admin.site.register(Question)
 admin.site.register(Choice)
+admin.site.register(ProgrammingTestCase)
 admin.site.register(TestSubmission)
 admin.site.register(QuestionSubmission)
-admin.site.register(UserReward) 
\ No newline at end of file
+admin.site.register(UserReward)
+admin.site.register(CourseViewBucket)
+admin.site.register(PopularCourse)
+admin.site.register(PopularityWindow)
+admin.site.register(RegradeCheckpoint)
+admin.site.register(PointsTransaction)
+admin.site.register(PointsBalance)
+admin.site.register(CoursePointsBalance)
+admin.site.register(CourseNeighbor)
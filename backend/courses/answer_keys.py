@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from django.core.cache import cache
+from .models import Question
+
+OBJECTIVE_TYPES = ('multiple_choice', 'true_false')
+
+# One entry per question, in question order. ``correct`` and ``choices``
+# (choice ID -> text) are only filled in for objective questions.
+AnswerKeyEntry = namedtuple('AnswerKeyEntry', ['question_type', 'points', 'correct', 'choices'])
+
+_local_keys = OrderedDict()
+_local_lock = threading.Lock()
+
+
+def _cache_key(test_id, version):
+    return f"courses:answer_key:{test_id}:{version}"
+
+
+def _build_answer_key(test_id):
+    key = {}
+    questions = Question.objects.filter(test_id=test_id).order_by('id').prefetch_related('choices')
+    for question in questions:
+        if question.question_type in OBJECTIVE_TYPES:
+            choices = list(question.choices.all())
+            key[question.id] = AnswerKeyEntry(
+                question.question_type,
+                question.points,
+                frozenset(c.id for c in choices if c.is_correct),
+                {c.id: c.choice_text for c in choices},
+            )
+        else:
+            key[question.id] = AnswerKeyEntry(question.question_type, question.points, frozenset(), {})
+    return key
+
+
+def get_answer_key(test):
+    """
+    Compiled answer key for a test.
+
+    Keys are cached in process and in the shared cache under the test's
+    version, which is bumped whenever one of its questions or choices
+    changes, so a stale key is never read.
+
+    Args:
+        test: The test, with a current ``version``
+
+    Returns:
+        Dict of question ID to AnswerKeyEntry
+    """
+    cache_key = _cache_key(test.id, test.version)
+    with _local_lock:
+        key = _local_keys.get(cache_key)
+        if key is not None:
+            _local_keys.move_to_end(cache_key)
+            return key
+
+    key = cache.get(cache_key)
+    if key is None:
+        key = _build_answer_key(test.id)
+        cache.set(cache_key, key, settings.ANSWER_KEY_CACHE_TIMEOUT)
+
+    with _local_lock:
+        _local_keys[cache_key] = key
+        while len(_local_keys) > settings.ANSWER_KEY_LOCAL_CACHE_SIZE:
+            _local_keys.popitem(last=False)
+    return key
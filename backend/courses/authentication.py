@@ -0,0 +1,25 @@
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+
+class BeaconJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that also accepts the access token as a ``token``
+    field in the request body, since ``navigator.sendBeacon`` cannot set an
+    Authorization header.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            return result
+
+        data = request.data
+        token = data.get('token') if isinstance(data, dict) else None
+        if not token:
+            return None
+        if not isinstance(token, str):
+            raise AuthenticationFailed('token must be a string')
+
+        validated_token = self.get_validated_token(token.encode())
+        return self.get_user(validated_token), validated_token
@@ -0,0 +1,62 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+
+_executors = {}
+_executors_pid = None
+_executor_lock = threading.Lock()
+
+
+def _pool_size(pool):
+    if pool == 'default':
+        return settings.BACKGROUND_WORKERS
+    return getattr(settings, f'{pool.upper()}_WORKERS')
+
+
+def _get_executor(pool):
+    # One set of pools per worker process, created lazily so forked workers get their own.
+    global _executors, _executors_pid
+    pid = os.getpid()
+    if _executors_pid != pid or pool not in _executors:
+        with _executor_lock:
+            if _executors_pid != pid:
+                _executors = {}
+                _executors_pid = pid
+            if pool not in _executors:
+                _executors[pool] = ThreadPoolExecutor(
+                    max_workers=_pool_size(pool),
+                    thread_name_prefix=f'background-{pool}'
+                )
+    return _executors[pool]
+
+
+def _call(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception as e:
+        print(f"Error in background task {func.__name__}: {str(e)}")
+        raise
+    finally:
+        # Pool threads keep their own connections; don't leak them between tasks
+        connections.close_all()
+
+
+def run_in_background(func, *args, pool='default', **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` on a background pool.
+
+    The task is submitted once the current transaction commits, so it always
+    sees the rows the request just wrote. Pools other than ``default`` are
+    sized by a ``<POOL>_WORKERS`` setting, so slow work such as grading
+    cannot starve the rest.
+    """
+    transaction.on_commit(
+        lambda: _get_executor(pool).submit(_call, func, args, kwargs)
+    )
+
+
+def submit(func, *args, pool='default', **kwargs):
+    """Run ``func(*args, **kwargs)`` on a background pool now and return its Future."""
+    return _get_executor(pool).submit(_call, func, args, kwargs)
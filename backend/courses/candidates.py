@@ -0,0 +1,112 @@
+import json
+import math
+import re
+from django.conf import settings
+from .content_index import get_content_index
+from .models import Course, CourseView, Enrollment
+from .recommender import recommend_courses
+
+# How much each retrieval signal counts towards a candidate's score
+SIMILARITY_WEIGHT = 0.4
+NEIGHBOR_WEIGHT = 0.3
+CATEGORY_WEIGHT = 0.2
+POPULARITY_WEIGHT = 0.1
+
+# Descriptions are cut to this length in prompts
+CANDIDATE_DESCRIPTION_CHARS = 300
+
+_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count for a prompt, without a tokenizer: a word is about
+    one token per four characters, punctuation one token each. Errs on the
+    high side for English text.
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_PATTERN.findall(text))
+
+
+def retrieve_candidates(user, limit=None):
+    """
+    Pick the courses worth showing the LLM, from cheap local signals only.
+
+    Candidates are pooled from the content index, the course neighbor table,
+    the categories the user has looked at and the most viewed courses, then
+    scored on a weighted mix of those signals. Courses the user has viewed
+    or enrolled in are left out.
+
+    Args:
+        user: The user to recommend for
+        limit: Number of candidates (defaults to RECOMMENDATION_CANDIDATES)
+
+    Returns:
+        List of (course, score between 0 and 1), best first
+    """
+    limit = limit or settings.RECOMMENDATION_CANDIDATES
+    history = set(CourseView.objects.filter(user=user).values_list('course_id', flat=True))
+    history.update(Enrollment.objects.filter(user=user).values_list('course_id', flat=True))
+    published = Course.objects.filter(is_published=True).exclude(id__in=history)
+
+    similarity = {}
+    if history:
+        for course_id, score in get_content_index().scores(list(history))[:limit * 2]:
+            similarity[course_id] = min(score / len(history), 1.0)
+    neighbors = {course.id: score for course, score, _ in recommend_courses(user, limit=limit * 2)}
+
+    categories = set(Course.objects.filter(id__in=history).exclude(
+        category__isnull=True
+    ).exclude(category='').values_list('category', flat=True))
+    pool = set(similarity) | set(neighbors)
+    if categories:
+        pool.update(published.filter(category__in=categories).order_by('-views_count').values_list('id', flat=True)[:limit * 2])
+    pool.update(published.order_by('-views_count').values_list('id', flat=True)[:limit])
+
+    courses = published.filter(id__in=pool).in_bulk()
+    if not courses:
+        return []
+    most_views = math.log1p(max(course.views_count for course in courses.values())) or 1
+
+    scores = {
+        course_id: (
+            SIMILARITY_WEIGHT * similarity.get(course_id, 0)
+            + NEIGHBOR_WEIGHT * neighbors.get(course_id, 0)
+            + CATEGORY_WEIGHT * (course.category in categories)
+            + POPULARITY_WEIGHT * math.log1p(course.views_count) / most_views
+        )
+        for course_id, course in courses.items()
+    }
+    ranked = sorted(scores, key=lambda course_id: (-scores[course_id], course_id))[:limit]
+    return [(courses[course_id], scores[course_id]) for course_id in ranked]
+
+
+def candidate_lines(candidates, budget, prompt=''):
+    """
+    One compact JSON line per candidate, best first, stopping before the
+    prompt would exceed ``budget`` estimated tokens.
+
+    Args:
+        candidates: (course, score) pairs from retrieve_candidates
+        budget: Token budget for the whole prompt
+        prompt: The rest of the prompt, counted against the budget
+
+    Returns:
+        List of JSON strings
+    """
+    remaining = budget - estimate_tokens(prompt)
+    lines = []
+    for course, _ in candidates:
+        line = json.dumps({
+            'id': course.id,
+            'title': course.title,
+            'category': course.category,
+            'level': course.level,
+            'tags': course.tags,
+            'description': course.description[:CANDIDATE_DESCRIPTION_CHARS],
+        })
+        cost = estimate_tokens(line)
+        if cost > remaining:
+            break
+        lines.append(line)
+        remaining -= cost
+    return lines
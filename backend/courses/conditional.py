@@ -0,0 +1,64 @@
+import time
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+CATALOG_VERSION_KEY = 'courses:catalog_version'
+
+
+def catalog_version() -> float:
+    """
+    Version stamp for the course catalog as a whole.
+
+    The stamp is the time of the last course change, so it doubles as a
+    Last-Modified value. If the stamp is evicted a new one is issued, which
+    only costs clients one full response.
+    """
+    return cache.get_or_set(CATALOG_VERSION_KEY, time.time, timeout=None)
+
+
+def bump_catalog_version():
+    """Mark the catalog as changed. Called whenever a course is saved or deleted."""
+    cache.set(CATALOG_VERSION_KEY, time.time(), timeout=None)
+
+
+def _timestamp(last_modified):
+    if last_modified is None:
+        return None
+    if hasattr(last_modified, 'timestamp'):
+        return int(last_modified.timestamp())
+    return int(last_modified)
+
+
+def not_modified(request, etag, last_modified=None, private=False):
+    """
+    Evaluate the request's conditional headers against cheap validators.
+
+    Returns the 304 (or 412) response to send if the client's copy is still
+    current, otherwise None, in which case the caller builds the full response
+    and passes it through with_validators().
+    """
+    return with_validators(
+        get_conditional_response(
+            request,
+            etag=quote_etag(etag),
+            last_modified=_timestamp(last_modified),
+        ),
+        etag,
+        last_modified,
+        private,
+    )
+
+
+def with_validators(response, etag, last_modified=None, private=False):
+    """Attach ETag and Last-Modified headers to a response."""
+    if response is None:
+        return None
+    response.headers['ETag'] = quote_etag(etag)
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(_timestamp(last_modified))
+    if private:
+        # Validators depend on who is asking
+        patch_cache_control(response, private=True)
+        patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,243 @@
+import pickle
+import re
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from .models import Course
+
+INDEX_KEY = 'courses:content_index'
+LOCK_KEY = 'courses:content_index:lock'
+
+# Fields are repeated to weight them: a title word counts three times a description word
+FIELD_WEIGHTS = (('title', 3), ('category', 2), ('tags', 2), ('description', 1))
+STOP_WORDS = frozenset(
+    'a an and are as at be by for from has in is it its of on or that the this to was will with you your'.split()
+)
+
+_local_index = None
+_local_lock = threading.Lock()
+
+# Courses changed in this process and not yet applied to the index
+_pending_updates = set()
+_pending_lock = threading.Lock()
+_flush_timer = None
+
+
+def _tokens(course):
+    tokens = []
+    for field, weight in FIELD_WEIGHTS:
+        value = course[field] if isinstance(course, dict) else getattr(course, field)
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(item) for item in value)
+        words = [
+            word for word in re.findall(r'\w+', (value or '').lower())
+            if len(word) > 1 and word not in STOP_WORDS
+        ]
+        tokens.extend(words * weight)
+    return tokens
+
+
+class ContentIndex:
+    """
+    TF-IDF vectors for the course catalog: a sparse float32 matrix with one
+    L2-normalized row per course, so cosine similarity is a dot product.
+
+    Changed rows are replaced in batches using the existing vocabulary and
+    IDF weights; words first seen in an update are left out until the next
+    full build.
+    """
+
+    def __init__(self, course_ids, matrix, vocabulary, idf):
+        self.course_ids = list(course_ids)
+        self.rows = {course_id: i for i, course_id in enumerate(self.course_ids)}
+        self.matrix = matrix
+        self.vocabulary = vocabulary
+        self.idf = idf
+
+    @classmethod
+    def build(cls, courses):
+        import numpy as np
+
+        documents = [(course['id'], _tokens(course)) for course in courses]
+        vocabulary = {}
+        document_frequency = []
+        for _, tokens in documents:
+            for term in set(tokens):
+                column = vocabulary.setdefault(term, len(vocabulary))
+                if column == len(document_frequency):
+                    document_frequency.append(0)
+                document_frequency[column] += 1
+
+        # Smoothed IDF, as in scikit-learn
+        idf = np.log((1 + len(documents)) / (1 + np.asarray(document_frequency, dtype=np.float32))) + 1
+        index = cls([], None, vocabulary, idf.astype(np.float32))
+        index.course_ids = [course_id for course_id, _ in documents]
+        index.rows = {course_id: i for i, course_id in enumerate(index.course_ids)}
+        index.matrix = index._vectorize([tokens for _, tokens in documents])
+        return index
+
+    def _vectorize(self, token_lists):
+        import numpy as np
+        from scipy import sparse
+
+        rows, cols, data = [], [], []
+        for row, tokens in enumerate(token_lists):
+            counts = {}
+            for token in tokens:
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+            weights = np.array([count * self.idf[column] for column, count in counts.items()], dtype=np.float32)
+            norm = np.linalg.norm(weights)
+            if norm:
+                weights /= norm
+            rows.extend([row] * len(counts))
+            cols.extend(counts)
+            data.extend(weights)
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), (rows, cols)),
+            shape=(len(token_lists), len(self.vocabulary)),
+        )
+
+    def replace(self, course_ids, courses):
+        """
+        Drop the rows of ``course_ids`` and append fresh rows for ``courses``
+        (those of them still indexed), copying the matrix once per batch.
+        """
+        from scipy import sparse
+
+        course_ids = set(course_ids)
+        keep = [i for i, course_id in enumerate(self.course_ids) if course_id not in course_ids]
+        self.course_ids = [self.course_ids[i] for i in keep] + [course['id'] for course in courses]
+        self.matrix = sparse.vstack(
+            [self.matrix[keep], self._vectorize([_tokens(course) for course in courses])],
+            format='csr'
+        )
+        self.rows = {course_id: i for i, course_id in enumerate(self.course_ids)}
+
+    def scores(self, course_ids):
+        """
+        Similarity of every course to the given courses, as one sparse
+        matrix-vector product.
+
+        Returns:
+            List of (course ID, score), best first, excluding ``course_ids``
+        """
+        import numpy as np
+
+        rows = [self.rows[course_id] for course_id in course_ids if course_id in self.rows]
+        if not rows:
+            return []
+        profile = np.asarray(self.matrix[rows].sum(axis=0)).ravel()
+        similarities = self.matrix @ profile
+        exclude = set(course_ids)
+        order = np.argsort(-similarities)
+        return [
+            (self.course_ids[i], float(similarities[i]))
+            for i in order
+            if similarities[i] > 0 and self.course_ids[i] not in exclude
+        ]
+
+
+def _indexed_courses():
+    return Course.objects.filter(is_published=True).values('id', *[field for field, _ in FIELD_WEIGHTS])
+
+
+def _save(index):
+    global _local_index
+    cache.set(INDEX_KEY, pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL), timeout=None)
+    with _local_lock:
+        _local_index = (time.time(), index)
+
+
+def build_content_index():
+    """Rebuild the index from every published course. Returns the number of courses indexed."""
+    index = ContentIndex.build(list(_indexed_courses()))
+    _save(index)
+    return len(index.course_ids)
+
+
+def get_content_index():
+    """The current index, built on first use. Reloaded from the cache at most every CONTENT_INDEX_RELOAD seconds."""
+    global _local_index
+    with _local_lock:
+        if _local_index is not None and time.time() - _local_index[0] < settings.CONTENT_INDEX_RELOAD:
+            return _local_index[1]
+
+    payload = cache.get(INDEX_KEY)
+    if payload is None:
+        build_content_index()
+        return _local_index[1]
+
+    index = pickle.loads(payload)
+    with _local_lock:
+        _local_index = (time.time(), index)
+    return index
+
+
+def _with_lock(func):
+    # Serialize read-modify-write of the shared index across workers
+    for _ in range(50):
+        if cache.add(LOCK_KEY, 1, timeout=30):
+            try:
+                return func()
+            finally:
+                cache.delete(LOCK_KEY)
+        time.sleep(0.1)
+    print("Error updating content index: lock not acquired")
+
+
+def update_courses_in_index(course_ids):
+    """Re-vectorize changed courses, dropping those now unpublished or deleted."""
+    def apply():
+        payload = cache.get(INDEX_KEY)
+        if payload is None:
+            build_content_index()
+            return
+        index = pickle.loads(payload)
+        index.replace(course_ids, list(_indexed_courses().filter(id__in=course_ids)))
+        _save(index)
+    _with_lock(apply)
+
+
+def _flush_pending_updates():
+    global _flush_timer
+    with _pending_lock:
+        course_ids = set(_pending_updates)
+        _pending_updates.clear()
+        _flush_timer = None
+    try:
+        update_courses_in_index(course_ids)
+    except Exception as e:
+        print(f"Error updating content index: {str(e)}")
+    finally:
+        connections.close_all()
+
+
+def schedule_course_update(course_id):
+    """
+    Queue a changed course for re-indexing. Courses queued within
+    CONTENT_INDEX_UPDATE_DELAY seconds are applied in one batch, so a burst
+    of saves costs one copy of the matrix rather than one per save.
+    """
+    global _flush_timer
+    with _pending_lock:
+        _pending_updates.add(course_id)
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(settings.CONTENT_INDEX_UPDATE_DELAY, _flush_pending_updates)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def similar_courses(course_ids, limit=10):
+    """
+    Published courses most similar in content to ``course_ids``.
+
+    Returns:
+        List of (course, score), best first
+    """
+    ranked = get_content_index().scores(list(course_ids))[:limit * 2]
+    courses = Course.objects.filter(id__in=[course_id for course_id, _ in ranked], is_published=True).in_bulk()
+    return [(courses[course_id], score) for course_id, score in ranked if course_id in courses][:limit]
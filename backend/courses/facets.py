@@ -0,0 +1,57 @@
+import hashlib
+from collections import Counter
+from django.core.cache import cache
+from django.db.models import Count
+from .conditional import catalog_version
+
+FACETS_CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(filters):
+    params = '&'.join(f"{name}={filters.get(name) or ''}" for name in sorted(filters))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    # The catalog version changes on every course save, which retires old entries
+    return f"courses:facets:{catalog_version()}:{digest}"
+
+
+def _buckets(counter):
+    return [
+        {'value': value, 'count': count}
+        for value, count in sorted(counter.items(), key=lambda item: (-item[1], str(item[0])))
+    ]
+
+
+def course_facets(get_queryset, filters):
+    """
+    Count courses per category and per level under the given filters.
+
+    Both facets come from one GROUP BY (category, level) query whose result
+    is cached until the catalog changes.
+
+    Args:
+        get_queryset: Callable returning the filtered Course queryset; only
+            called on a cache miss, so cached hits skip the search too
+        filters: The filter and search parameters applied by ``get_queryset``
+
+    Returns:
+        Dict with the total and per-category / per-level counts
+    """
+    key = _cache_key(filters)
+    facets = cache.get(key)
+    if facets is not None:
+        return facets
+
+    rows = get_queryset().order_by().values('category', 'level').annotate(count=Count('id'))
+
+    categories, levels = Counter(), Counter()
+    for row in rows:
+        categories[row['category']] += row['count']
+        levels[row['level']] += row['count']
+
+    facets = {
+        'total': sum(categories.values()),
+        'categories': _buckets(categories),
+        'levels': _buckets(levels),
+    }
+    cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
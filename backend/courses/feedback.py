@@ -0,0 +1,98 @@
+from collections import OrderedDict, namedtuple
+from .models import Question
+
+# Per-question outcome of grading; ``number`` is the question's 1-based position
+# in the test and ``score`` is None if it was not graded
+QuestionResult = namedtuple('QuestionResult', ['question_id', 'number', 'question_type', 'points', 'score', 'feedback'])
+
+QUESTION_TYPE_NAMES = dict(Question.QUESTION_TYPE_CHOICES)
+
+# Truncation length for each question's feedback at the second digest level
+DIGEST_FEEDBACK_CHARS = 200
+
+
+def _by_type(results):
+    totals = OrderedDict()
+    for result in results:
+        if result.score is None:
+            continue
+        earned, possible, missed = totals.get(result.question_type, (0, 0, []))
+        if result.score < result.points:
+            missed = missed + [result.number]
+        totals[result.question_type] = (earned + result.score, possible + result.points, missed)
+    return totals
+
+
+def generate_template_feedback(test, score: int, passed: bool, results) -> str:
+    """
+    Overall feedback built from per-question scores, without an AI call.
+
+    Summarizes the result, the strongest and weakest question types, the
+    questions to review and a study recommendation.
+    """
+    lines = [
+        f"You scored {score}/{test.max_score} on {test.title} and "
+        f"{'passed' if passed else 'did not pass'} (passing score: {test.passing_score})."
+    ]
+
+    totals = _by_type(results)
+    rates = {
+        question_type: earned / possible
+        for question_type, (earned, possible, _) in totals.items()
+        if possible
+    }
+    if rates:
+        strongest = max(rates, key=rates.get)
+        weakest = min(rates, key=rates.get)
+        earned, possible, _ = totals[strongest]
+        lines.append(f"Strongest area: {QUESTION_TYPE_NAMES.get(strongest, strongest)} ({earned}/{possible} points).")
+        if weakest != strongest and rates[weakest] < 1:
+            earned, possible, _ = totals[weakest]
+            lines.append(f"Needs work: {QUESTION_TYPE_NAMES.get(weakest, weakest)} ({earned}/{possible} points).")
+
+    missed = [number for _, _, numbers in totals.values() for number in numbers]
+    if missed:
+        lines.append(f"Review questions: {', '.join(str(number) for number in sorted(missed))}.")
+
+    ungraded = sum(1 for result in results if result.score is None)
+    if ungraded:
+        lines.append(f"{ungraded} answer(s) have not been scored yet and are not counted.")
+
+    if not passed:
+        lines.append("Revisit the course material for the questions above before retaking the test.")
+    elif missed:
+        lines.append("Good work. Go over the questions you missed to consolidate what you learned.")
+    else:
+        lines.append("Excellent work, you answered every question correctly.")
+
+    return "\n".join(lines)
+
+
+def question_feedback_digest(results, max_chars: int) -> str:
+    """
+    Per-question feedback for the overall feedback prompt, cut down until it
+    fits in ``max_chars``: first every question's full feedback, then each
+    truncated, then only per-type totals and the questions missed.
+    """
+    graded = [result for result in results if result.score is not None]
+
+    full = "\n".join(
+        f"Question {result.number}: {result.feedback}" for result in graded
+    )
+    if len(full) <= max_chars:
+        return full
+
+    truncated = "\n".join(
+        f"Question {result.number} ({result.score}/{result.points}): "
+        f"{result.feedback[:DIGEST_FEEDBACK_CHARS]}"
+        for result in graded
+    )
+    if len(truncated) <= max_chars:
+        return truncated
+
+    summary = "\n".join(
+        f"{QUESTION_TYPE_NAMES.get(question_type, question_type)}: {earned}/{possible} points"
+        + (f", missed questions {', '.join(str(number) for number in missed)}" if missed else "")
+        for question_type, (earned, possible, missed) in _by_type(graded).items()
+    )
+    return summary[:max_chars]
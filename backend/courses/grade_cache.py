@@ -0,0 +1,94 @@
+import hashlib
+import json
+import re
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+GRADE_KINDS = ('short_answer', 'programming')
+
+_STATS_KEY = 'courses:grade_cache:{kind}:{outcome}'
+
+
+def normalize_answer(kind: str, answer_text: str) -> str:
+    """
+    Reduce an answer to the form grades are cached under.
+
+    Short answers ignore case and whitespace runs. Code keeps its case and
+    indentation but ignores trailing whitespace and blank lines.
+    """
+    answer_text = answer_text or ''
+    if kind == 'programming':
+        lines = (line.rstrip() for line in answer_text.splitlines())
+        return '\n'.join(line for line in lines if line)
+    return re.sub(r'\s+', ' ', answer_text).strip().casefold()
+
+
+def grade_cache_key(kind: str, prompt_version: int, question, answer_text: str) -> str:
+    """
+    Content-addressed cache key for an AI grade.
+
+    The question's test version is part of the key, so editing a question or
+    its reference answer retires every grade cached for it.
+    """
+    payload = json.dumps([
+        question.id,
+        question.test.version,
+        prompt_version,
+        normalize_answer(kind, answer_text),
+    ])
+    return f"courses:grade:{kind}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+
+def _count(kind, outcome):
+    key = _STATS_KEY.format(kind=kind, outcome=outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def get_cached_grade(kind: str, key: str):
+    """Return the cached (score, feedback) for ``key``, or None, recording the hit or miss."""
+    grade = cache.get(key)
+    _count(kind, 'hits' if grade is not None else 'misses')
+    return tuple(grade) if grade is not None else None
+
+
+def set_cached_grade(key: str, grade):
+    cache.set(key, list(grade), settings.GRADE_CACHE_TIMEOUT)
+
+
+def stats_are_shared() -> bool:
+    """
+    Whether the hit and miss counters are shared by every worker. They live
+    in the default cache, so with the per-process memory cache (no
+    REDIS_URL) each process counts alone and nothing outside it sees them.
+    """
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def grade_cache_stats():
+    """Hits, misses and hit rate for each kind of AI-graded question."""
+    stats = {}
+    for kind in GRADE_KINDS:
+        hits = cache.get(_STATS_KEY.format(kind=kind, outcome='hits'), 0)
+        misses = cache.get(_STATS_KEY.format(kind=kind, outcome='misses'), 0)
+        total = hits + misses
+        stats[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+    return stats
+
+
+def reset_grade_cache_stats():
+    cache.delete_many([
+        _STATS_KEY.format(kind=kind, outcome=outcome)
+        for kind in GRADE_KINDS
+        for outcome in ('hits', 'misses')
+    ])
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .background import run_in_background
+from .models import TestSubmission
+from .services import evaluate_test_submission, award_rewards
+
+
+def enqueue_grading(submission: TestSubmission):
+    """Grade a submission on the grading pool once the current transaction commits."""
+    run_in_background(grade_submission, submission.id, pool='grading')
+
+
+# Fields set by apply_evaluation, for bulk_update
+GRADED_FIELDS = ['score', 'status', 'ai_feedback', 'ai_score', 'graded_at']
+
+
+def apply_evaluation(submission: TestSubmission, evaluation_result):
+    """Copy an evaluate_test_submission() result onto a submission, without saving it."""
+    submission.score = evaluation_result['score']
+    if evaluation_result['partial']:
+        # Some answers timed out; grade_pending_submissions retries it
+        submission.status = 'partially_graded'
+    else:
+        submission.status = 'graded' if evaluation_result['passed'] else 'failed'
+    submission.ai_feedback = evaluation_result['feedback']
+    submission.ai_score = evaluation_result['ai_score']
+    submission.graded_at = timezone.now()
+
+
+def gradable_submissions():
+    """
+    Submissions waiting to be graded: pending ones, and partially graded ones
+    with attempts left. A submission still partially graded after
+    GRADING_MAX_ATTEMPTS runs keeps that status for good.
+    """
+    return TestSubmission.objects.filter(
+        Q(status='pending')
+        | Q(status='partially_graded', grading_attempts__lt=settings.GRADING_MAX_ATTEMPTS)
+    )
+
+
+def grade_submission(submission_id: int):
+    """
+    Grade a pending or partially graded submission and award its rewards.
+
+    The submission is claimed by moving it to ``grading``, so a submission
+    queued twice is only graded once. A retried submission's rewards are
+    replaced rather than awarded again (see award_rewards).
+
+    Args:
+        submission_id: ID of the submission to grade
+
+    Returns:
+        The graded submission, or None if it was not waiting to be graded
+    """
+    previous_status = gradable_submissions().filter(id=submission_id).values_list('status', flat=True).first()
+    if previous_status is None:
+        return None
+    claimed = TestSubmission.objects.filter(id=submission_id, status=previous_status).update(
+        status='grading',
+        grading_started_at=timezone.now(),
+        grading_attempts=F('grading_attempts') + 1
+    )
+    if not claimed:
+        return None
+
+    submission = TestSubmission.objects.select_related('test', 'user').get(id=submission_id)
+    try:
+        evaluation_result = evaluate_test_submission(submission)
+    except Exception:
+        # Leave it for grade_pending_submissions to retry
+        TestSubmission.objects.filter(id=submission_id).update(
+            status=previous_status,
+            grading_started_at=None
+        )
+        raise
+
+    with transaction.atomic():
+        apply_evaluation(submission, evaluation_result)
+        submission.save()
+
+        award_rewards(submission)
+
+    return submission
+
+
+def release_stale_submissions(stale_after: timedelta) -> int:
+    """
+    Return submissions stuck in ``grading`` (e.g. their worker was restarted)
+    to ``pending``.
+
+    Returns:
+        Number of submissions released
+    """
+    return TestSubmission.objects.filter(
+        status='grading',
+        grading_started_at__lt=timezone.now() - stale_after
+    ).update(status='pending', grading_started_at=None)
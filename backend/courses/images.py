@@ -0,0 +1,115 @@
+import hashlib
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .models import Course, User
+
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+VARIANT_FORMATS = {
+    # content type: (Pillow format, extension, save options)
+    'image/webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'image/jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _content_hash(field_file):
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def _render(image, width, pil_format, options):
+    resized = image.copy()
+    resized.thumbnail((width, width * 10), Image.LANCZOS)
+    if pil_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+        resized = resized.convert('RGB')
+    buffer = BytesIO()
+    resized.save(buffer, pil_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(field_file):
+    """
+    Generate resized WebP and JPEG variants of an uploaded image.
+
+    Variants are stored under ``derived/<sha256 of the original>/`` so the
+    same upload (e.g. a thumbnail reused across courses) is only processed
+    once. Widths larger than the original are skipped.
+
+    Args:
+        field_file: The ImageField file to process
+
+    Returns:
+        Dict with the source file name and a {content type: {width: storage name}} map
+    """
+    content_hash = _content_hash(field_file)
+    prefix = f"derived/{content_hash[:2]}/{content_hash}"
+
+    field_file.open('rb')
+    try:
+        image = ImageOps.exif_transpose(Image.open(field_file))
+        image.load()
+    finally:
+        field_file.close()
+
+    variants = {}
+    widths = [width for width in VARIANT_WIDTHS if width < image.width] or [image.width]
+    for content_type, (pil_format, extension, options) in VARIANT_FORMATS.items():
+        variants[content_type] = {}
+        for width in widths:
+            name = f"{prefix}/{width}.{extension}"
+            if not default_storage.exists(name):
+                name = default_storage.save(name, _render(image, width, pil_format, options))
+            variants[content_type][str(width)] = name
+
+    return {'source': field_file.name, 'variants': variants}
+
+
+def needs_variants(field_file, current):
+    """True if the image has changed since its variants were generated."""
+    return bool(field_file) and (current or {}).get('source') != field_file.name
+
+
+def srcset(variants, request=None):
+    """
+    Build ``{content type: "url 160w, url 320w, ..."}`` from stored variants,
+    ready for <source type=... srcset=...> elements.
+    """
+    result = {}
+    for content_type, by_width in (variants or {}).get('variants', {}).items():
+        entries = []
+        for width, name in sorted(by_width.items(), key=lambda item: int(item[0])):
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            entries.append(f"{url} {width}w")
+        result[content_type] = ', '.join(entries)
+    return result
+
+
+def process_course_thumbnail(course_id):
+    course = Course.objects.filter(id=course_id).first()
+    if course is None or not needs_variants(course.thumbnail, course.thumbnail_variants):
+        return
+    Course.objects.filter(id=course_id, thumbnail=course.thumbnail.name).update(
+        thumbnail_variants=generate_variants(course.thumbnail),
+        updated_at=timezone.now()
+    )
+
+
+def process_user_avatar(user_id):
+    user = User.objects.filter(id=user_id).first()
+    if user is None or not needs_variants(user.avatar, user.avatar_variants):
+        return
+    User.objects.filter(id=user_id, avatar=user.avatar.name).update(
+        avatar_variants=generate_variants(user.avatar)
+    )
+    # Course payloads embed the instructor's avatar
+    Course.objects.filter(instructor_id=user_id).update(updated_at=timezone.now())
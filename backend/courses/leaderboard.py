@@ -0,0 +1,187 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Min, Sum
+from django.utils import timezone
+from .models import Course, CourseView, CourseViewBucket, PopularCourse, PopularityWindow
+
+WINDOWS = {
+    '24h': timedelta(hours=24),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+}
+DEFAULT_WINDOW = '30d'
+
+_last_expired_hour = None
+
+
+def current_hour(now=None):
+    """Truncate a timestamp to the start of its hour bucket."""
+    now = now or timezone.now()
+    return now.replace(minute=0, second=0, microsecond=0)
+
+
+def _increment(queryset, amounts):
+    """Add ``amounts[course_id]`` to ``views``, one UPDATE per distinct amount."""
+    by_amount = defaultdict(list)
+    for course_id, amount in amounts.items():
+        if amount:
+            by_amount[amount].append(course_id)
+    for amount, course_ids in by_amount.items():
+        queryset.filter(course_id__in=course_ids).update(views=F('views') + amount)
+
+
+def record_views(counts, now=None):
+    """
+    Add newly flushed views to the current hour bucket and every window total.
+
+    Rows are inserted first (ignoring conflicts) and then incremented, so
+    concurrent flushers from several workers never overwrite each other.
+
+    Args:
+        counts: Mapping of course ID to number of new views
+        now: Time the views are attributed to (defaults to now)
+    """
+    if not counts:
+        return
+
+    hour = current_hour(now)
+    categories = dict(Course.objects.filter(id__in=counts).values_list('id', 'category'))
+    course_ids = [course_id for course_id in counts if course_id in categories]
+
+    with transaction.atomic():
+        CourseViewBucket.objects.bulk_create(
+            [CourseViewBucket(course_id=course_id, hour=hour) for course_id in course_ids],
+            ignore_conflicts=True,
+        )
+        _increment(CourseViewBucket.objects.filter(hour=hour), counts)
+
+        PopularCourse.objects.bulk_create(
+            [
+                PopularCourse(window=window, course_id=course_id, category=categories[course_id])
+                for window in WINDOWS
+                for course_id in course_ids
+            ],
+            ignore_conflicts=True,
+        )
+        _increment(PopularCourse.objects.filter(window__in=WINDOWS), counts)
+
+
+def expire_windows(now=None):
+    """
+    Subtract hour buckets that have left each window since the last run.
+
+    Each window keeps a watermark in PopularityWindow, so running this from
+    several workers (or after a long pause) subtracts every bucket exactly once.
+    """
+    hour = current_hour(now)
+
+    for window, span in WINDOWS.items():
+        cutoff = hour - span + timedelta(hours=1)
+        with transaction.atomic():
+            oldest = CourseViewBucket.objects.aggregate(oldest=Min('hour'))['oldest']
+            mark, _ = PopularityWindow.objects.select_for_update().get_or_create(
+                window=window,
+                defaults={'expired_before': min(oldest or cutoff, cutoff)},
+            )
+            if mark.expired_before >= cutoff:
+                continue
+
+            expired = CourseViewBucket.objects.filter(
+                hour__gte=mark.expired_before, hour__lt=cutoff
+            ).values('course_id').annotate(total=Sum('views'))
+            _increment(
+                PopularCourse.objects.filter(window=window),
+                {row['course_id']: -row['total'] for row in expired},
+            )
+
+            mark.expired_before = cutoff
+            mark.save(update_fields=['expired_before'])
+
+    # Buckets older than the longest window have been subtracted everywhere.
+    longest = max(WINDOWS.values())
+    CourseViewBucket.objects.filter(hour__lt=hour - longest + timedelta(hours=1)).delete()
+
+
+def expire_windows_if_due(now=None):
+    """Run expire_windows at most once per hour bucket in this process."""
+    global _last_expired_hour
+    hour = current_hour(now)
+    if _last_expired_hour == hour:
+        return
+    expire_windows(now)
+    _last_expired_hour = hour
+
+
+def backfill_popularity(now=None):
+    """
+    Rebuild the hour buckets and window totals from existing CourseView rows,
+    replacing whatever they hold.
+
+    Only each user's latest view of a course is on record, so this
+    undercounts repeat and anonymous views; it is meant to seed the windows
+    once, before live counting takes over.
+
+    Returns:
+        Number of PopularCourse rows written
+    """
+    hour = current_hour(now)
+    since = hour - max(WINDOWS.values()) + timedelta(hours=1)
+    buckets = Counter(
+        (course_id, current_hour(viewed_at))
+        for course_id, viewed_at in CourseView.objects.filter(
+            viewed_at__gte=since
+        ).values_list('course_id', 'viewed_at').iterator()
+    )
+    categories = dict(Course.objects.filter(
+        id__in={course_id for course_id, _ in buckets}
+    ).values_list('id', 'category'))
+
+    popular = []
+    marks = []
+    for window, span in WINDOWS.items():
+        cutoff = hour - span + timedelta(hours=1)
+        totals = Counter()
+        for (course_id, bucket_hour), views in buckets.items():
+            if bucket_hour >= cutoff:
+                totals[course_id] += views
+        popular.extend(
+            PopularCourse(window=window, course_id=course_id, category=categories[course_id], views=views)
+            for course_id, views in totals.items()
+        )
+        # Everything before the cutoff has already been left out of this window
+        marks.append(PopularityWindow(window=window, expired_before=cutoff))
+
+    with transaction.atomic():
+        CourseViewBucket.objects.all().delete()
+        PopularCourse.objects.all().delete()
+        PopularityWindow.objects.all().delete()
+        CourseViewBucket.objects.bulk_create(
+            [
+                CourseViewBucket(course_id=course_id, hour=bucket_hour, views=views)
+                for (course_id, bucket_hour), views in buckets.items()
+            ],
+            batch_size=1000,
+        )
+        PopularCourse.objects.bulk_create(popular, batch_size=1000)
+        PopularityWindow.objects.bulk_create(marks)
+    return len(popular)
+
+
+def top_courses(window=DEFAULT_WINDOW, category=None, limit=6):
+    """
+    Return the most viewed published courses for a window.
+
+    Reads the precomputed totals through the (window, category, views)
+    index, so the cost depends only on ``limit``.
+    """
+    entries = PopularCourse.objects.filter(
+        window=window,
+        views__gt=0,
+        course__is_published=True
+    )
+    if category:
+        entries = entries.filter(category=category)
+
+    entries = entries.select_related('course__instructor').order_by('-views')[:limit]
+    return [entry.course for entry in entries]
@@ -0,0 +1,195 @@
+import os
+import random
+import threading
+import time
+from django.conf import settings
+
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+
+
+class LLMError(Exception):
+    """An LLM call failed. Callers catch this and use their local fallback."""
+
+
+class LLMUnavailable(LLMError):
+    """The LLM was not called or gave up: not configured, circuit open, or out of time or retries."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing service for a while.
+
+    After ``threshold`` consecutive failures the circuit opens and calls are
+    refused for ``reset_timeout`` seconds. Then a single trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of calls, so retries cannot multiply the load
+    on a struggling service. Each call earns ``ratio`` of a retry, up to
+    ``max_tokens`` saved; each retry spends one.
+    """
+
+    def __init__(self, ratio, max_tokens):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+breaker = CircuitBreaker(settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_RESET)
+retry_budget = RetryBudget(settings.LLM_RETRY_BUDGET_RATIO, settings.LLM_RETRY_BUDGET_MAX)
+
+
+def get_client():
+    """
+    The shared OpenAI client, one per worker process. Its HTTP connection
+    pool is reused by every call; the client's own retries are disabled in
+    favour of chat_completion's.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                import httpx
+                import openai
+                _client = openai.OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=settings.OPENAI_BASE_URL or None,
+                    max_retries=0,
+                    http_client=httpx.Client(limits=httpx.Limits(
+                        max_connections=settings.LLM_MAX_CONNECTIONS,
+                        max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+                    )),
+                )
+                _client_pid = pid
+    return _client
+
+
+def _retryable_errors():
+    import openai
+    return (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+
+def chat_completion(messages, model=DEFAULT_MODEL, timeout=None, deadline=None, **params) -> str:
+    """
+    Send a chat completion request and return the reply text.
+
+    Timeouts, connection errors, rate limiting and server errors are retried
+    with full-jitter exponential backoff, while the retry budget allows and
+    time remains before the deadline. Consecutive failures open the circuit
+    breaker, after which calls fail immediately until it resets.
+
+    Args:
+        messages: Chat messages, as for the OpenAI API
+        model: Model name
+        timeout: Seconds allowed for each attempt (defaults to LLM_CALL_TIMEOUT)
+        deadline: Seconds allowed for the whole call, retries included
+            (defaults to LLM_REQUEST_DEADLINE)
+        **params: Other request parameters, e.g. temperature and max_tokens
+
+    Returns:
+        The reply text
+
+    Raises:
+        LLMError: The call failed; LLMUnavailable if it was refused or gave up
+    """
+    import openai
+
+    if not settings.OPENAI_API_KEY:
+        raise LLMUnavailable('OpenAI API key is not configured')
+
+    timeout = timeout or settings.LLM_CALL_TIMEOUT
+    deadline_at = time.monotonic() + (deadline or settings.LLM_REQUEST_DEADLINE)
+    retry_budget.deposit()
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            raise LLMUnavailable('OpenAI circuit breaker is open')
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailable('OpenAI request deadline exceeded')
+
+        try:
+            response = get_client().chat.completions.create(
+                model=model,
+                messages=messages,
+                timeout=min(timeout, remaining),
+                **params
+            )
+        except _retryable_errors() as e:
+            breaker.record_failure()
+            attempt += 1
+            delay = random.uniform(0, min(settings.LLM_BACKOFF_CAP, settings.LLM_BACKOFF_BASE * 2 ** attempt))
+            if attempt > settings.LLM_MAX_RETRIES or time.monotonic() + delay >= deadline_at:
+                raise LLMUnavailable(f"OpenAI request failed after {attempt} attempt(s): {str(e)}") from e
+            if not retry_budget.withdraw():
+                raise LLMUnavailable(f"OpenAI retry budget exhausted: {str(e)}") from e
+            time.sleep(delay)
+            continue
+        except openai.OpenAIError as e:
+            # The service answered (e.g. a bad request), so it is not counted against the breaker
+            breaker.record_success()
+            raise LLMError(str(e)) from e
+        except Exception as e:
+            breaker.record_failure()
+            raise LLMError(str(e)) from e
+
+        breaker.record_success()
+        return response.choices[0].message.content or ''
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.leaderboard import backfill_popularity
+from courses.models import PopularCourse
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed the popular-course windows from existing course views. Run once '
+        'after deploying the rolling windows, so /api/courses/popular/ is not '
+        'empty until new views arrive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--replace',
+            action='store_true',
+            help='Overwrite windows that already hold live counts.'
+        )
+
+    def handle(self, *args, **options):
+        if PopularCourse.objects.exists() and not options['replace']:
+            raise CommandError(
+                'Popular-course windows already hold counts; pass --replace to overwrite them'
+            )
+        rows = backfill_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} popular course total(s)"))
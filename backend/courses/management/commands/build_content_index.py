@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from courses.content_index import build_content_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the course content-similarity index, picking up words added '
+        'since the last full build.'
+    )
+
+    def handle(self, *args, **options):
+        courses = build_content_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {courses} course(s)"))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from courses.recommender import build_course_neighbors
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the course neighbor table used for recommendations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=None, help='Neighbors kept per course.')
+
+    def handle(self, *args, **options):
+        rows = build_course_neighbors(k=options['k'])
+        self.stdout.write(self.style.SUCCESS(f"Stored {rows} course neighbor(s)"))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.grade_cache import grade_cache_stats, reset_grade_cache_stats, stats_are_shared
+
+
+class Command(BaseCommand):
+    help = 'Show hit rates of the AI grade cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Reset the counters after printing them.'
+        )
+
+    def handle(self, *args, **options):
+        if not stats_are_shared():
+            raise CommandError(
+                'Grade cache counters are kept per process in the local memory cache, '
+                'so this command cannot see them. Set REDIS_URL to share the cache.'
+            )
+        for kind, stats in grade_cache_stats().items():
+            self.stdout.write(
+                f"{kind}: {stats['hits']} hits, {stats['misses']} misses "
+                f"({stats['hit_rate']:.1%} hit rate)"
+            )
+        if options['reset']:
+            reset_grade_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
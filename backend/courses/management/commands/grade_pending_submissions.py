@@ -0,0 +1,43 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from courses.grading import gradable_submissions, grade_submission, release_stale_submissions
+
+
+class Command(BaseCommand):
+    help = (
+        'Grade test submissions left pending, e.g. after a worker restart, and '
+        'retry partially graded ones that have attempts left.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stale-minutes',
+            type=int,
+            default=15,
+            help='Treat submissions that have been grading for this long as abandoned.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Maximum number of submissions to grade in this run.'
+        )
+
+    def handle(self, *args, **options):
+        released = release_stale_submissions(timedelta(minutes=options['stale_minutes']))
+        if released:
+            self.stdout.write(f"Released {released} stale submission(s)")
+
+        submission_ids = gradable_submissions().order_by(
+            'submitted_at'
+        ).values_list('id', flat=True)[:options['limit']]
+
+        graded = 0
+        for submission_id in submission_ids:
+            try:
+                if grade_submission(submission_id) is not None:
+                    graded += 1
+            except Exception as e:
+                self.stderr.write(f"Error grading submission {submission_id}: {str(e)}")
+
+        self.stdout.write(self.style.SUCCESS(f"Graded {graded} submission(s)"))
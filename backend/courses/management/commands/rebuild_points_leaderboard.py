@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from courses.points import rebuild_leaderboard_sets
+
+
+class Command(BaseCommand):
+    help = 'Reload the Redis points leaderboard from the points ledger and balances.'
+
+    def handle(self, *args, **options):
+        keys = rebuild_leaderboard_sets()
+        if keys is None:
+            self.stdout.write('REDIS_URL is not set; leaderboards are read from the database.')
+            return
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {keys} leaderboard key(s)"))
@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from courses.grading import GRADED_FIELDS, apply_evaluation, gradable_submissions
+from courses.models import RegradeCheckpoint, TestSubmission
+from courses.services import award_rewards, evaluate_test_submission
+
+# Submissions still owned by the grading queue (pending, grading, or
+# partially graded with attempts left) are left alone
+REGRADABLE_STATUSES = ('graded', 'failed', 'partially_graded')
+
+
+def _regrade(submission):
+    # Returns (submission, whether its score or status changed, error)
+    before = (submission.score, submission.status)
+    try:
+        # Overall feedback is only rewritten when the result changes
+        apply_evaluation(submission, evaluate_test_submission(submission, reuse_feedback=True))
+        return submission, (submission.score, submission.status) != before, None
+    except Exception as e:
+        return submission, False, e
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-grade every graded submission for a test or course, e.g. after '
+        'fixing an answer key. Progress is checkpointed, so an interrupted '
+        'run resumes where it stopped. Submissions whose score or status '
+        'changes have their rewards and points adjusted to match.'
+    )
+
+    def add_arguments(self, parser):
+        scope = parser.add_mutually_exclusive_group(required=True)
+        scope.add_argument('--test', type=int, help='ID of the test to re-grade.')
+        scope.add_argument('--course', type=int, help='ID of the course whose tests to re-grade.')
+        parser.add_argument('--workers', type=int, default=4, help='Submissions graded in parallel.')
+        parser.add_argument('--batch-size', type=int, default=50, help='Submissions per checkpoint.')
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any saved checkpoint and start from the first submission.'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive')
+
+        if options['test'] is not None:
+            scope = f"test:{options['test']}"
+            submissions = TestSubmission.objects.filter(test_id=options['test'])
+        else:
+            scope = f"course:{options['course']}"
+            submissions = TestSubmission.objects.filter(test__course_id=options['course'])
+
+        if options['restart']:
+            RegradeCheckpoint.objects.filter(scope=scope).delete()
+        checkpoint, created = RegradeCheckpoint.objects.get_or_create(scope=scope)
+        if not created:
+            self.stdout.write(
+                f"Resuming {scope} after submission {checkpoint.last_submission_id} "
+                f"({checkpoint.regraded} already re-graded)"
+            )
+
+        remaining = submissions.filter(
+            status__in=REGRADABLE_STATUSES,
+            id__gt=checkpoint.last_submission_id
+        ).exclude(
+            id__in=gradable_submissions().values('id')
+        ).select_related('test__course', 'user').order_by('id')
+        total = remaining.count()
+        self.stdout.write(f"Re-grading {total} submission(s) for {scope}")
+
+        done = failed = reconciled = 0
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                # Keyset batches rather than one long-lived cursor, which would
+                # hold a read lock (and on SQLite block our own writes) for the whole run
+                batch = list(remaining.filter(id__gt=checkpoint.last_submission_id)[:options['batch_size']])
+                if not batch:
+                    break
+                batch_failed, batch_reconciled = self._run_batch(pool, batch, checkpoint)
+                failed += batch_failed
+                reconciled += batch_reconciled
+                done += len(batch)
+                self._report(done, total, failed, started)
+
+        # A finished run starts from scratch next time
+        checkpoint.delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-graded {done - failed} submission(s) for {scope}, {failed} failed, "
+            f"rewards adjusted for {reconciled}"
+        ))
+
+    def _run_batch(self, pool, batch, checkpoint):
+        regraded, changed, failed = [], [], 0
+        for submission, is_changed, error in pool.map(_regrade, batch):
+            if error is None:
+                regraded.append(submission)
+                if is_changed:
+                    changed.append(submission)
+            else:
+                failed += 1
+                self.stderr.write(f"Error re-grading submission {submission.id}: {str(error)}")
+
+        # Scores, rewards, the points ledger and the checkpoint move together
+        with transaction.atomic():
+            TestSubmission.objects.bulk_update(regraded, GRADED_FIELDS)
+            for submission in changed:
+                award_rewards(submission)
+            checkpoint.last_submission_id = batch[-1].id
+            checkpoint.regraded += len(regraded)
+            checkpoint.save()
+        return failed, len(changed)
+
+    def _report(self, done, total, failed, started):
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        eta = (total - done) / rate if rate else 0
+        self.stdout.write(
+            f"{done}/{total} done, {failed} failed, "
+            f"{rate:.1f} submissions/s, ETA {int(eta // 60)}m{int(eta % 60):02d}s"
+        )
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularityWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 hours'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')], max_length=3, unique=True)),
+                ('expired_before', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CourseViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='courses.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='courses_cou_hour_b4c55d_idx')],
+                'unique_together': {('course', 'hour')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PopularCourse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('24h', 'Last 24 hours'), ('7d', 'Last 7 days'), ('30d', 'Last 30 days')], max_length=3)),
+                ('category', models.CharField(blank=True, max_length=100, null=True)),
+                ('views', models.IntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='courses.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', '-views'], name='courses_pop_window_7b50f5_idx'), models.Index(fields=['window', 'category', '-views'], name='courses_pop_window_120bcb_idx')],
+                'unique_together': {('window', 'course')},
+            },
+        ),
+    ]
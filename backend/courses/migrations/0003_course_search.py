@@ -0,0 +1,119 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:41
+
+from django.db import migrations, models
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(NEW.category, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.tags::text, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.description, '')), 'C')
+"""
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE courses_course ADD COLUMN search_document tsvector",
+    f"""
+    CREATE FUNCTION courses_course_search_document() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_document := {POSTGRES_DOCUMENT};
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER courses_course_search_document
+    BEFORE INSERT OR UPDATE OF title, description, category, tags ON courses_course
+    FOR EACH ROW EXECUTE FUNCTION courses_course_search_document()
+    """,
+    # Fires the trigger once for every existing course
+    "UPDATE courses_course SET title = title",
+    "CREATE INDEX courses_course_search_document_idx ON courses_course USING gin (search_document)",
+    "CREATE INDEX courses_course_title_trgm_idx ON courses_course USING gin (title gin_trgm_ops)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS courses_course_title_trgm_idx",
+    "DROP TRIGGER IF EXISTS courses_course_search_document ON courses_course",
+    "DROP FUNCTION IF EXISTS courses_course_search_document()",
+    "ALTER TABLE courses_course DROP COLUMN IF EXISTS search_document",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE courses_course_fts USING fts5(
+        title, description, category, tags,
+        content='courses_course', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER courses_course_fts_insert AFTER INSERT ON courses_course BEGIN
+        INSERT INTO courses_course_fts(rowid, title, description, category, tags)
+        VALUES (new.id, new.title, new.description, new.category, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_course_fts_delete AFTER DELETE ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, description, category, tags)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_course_fts_update
+    AFTER UPDATE OF title, description, category, tags ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, description, category, tags)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.tags);
+        INSERT INTO courses_course_fts(rowid, title, description, category, tags)
+        VALUES (new.id, new.title, new.description, new.category, new.tags);
+    END
+    """,
+    "INSERT INTO courses_course_fts(courses_course_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS courses_course_fts_update",
+    "DROP TRIGGER IF EXISTS courses_course_fts_delete",
+    "DROP TRIGGER IF EXISTS courses_course_fts_insert",
+    "DROP TABLE IF EXISTS courses_course_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement, params=None)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+    elif vendor == 'sqlite':
+        try:
+            _run(schema_editor, SQLITE_FORWARD)
+        except Exception as e:
+            # SQLite builds without FTS5 fall back to unindexed search
+            print(f"Skipping SQLite full-text index: {str(e)}")
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+    elif vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0002_popular_courses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='tags',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0003_course_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_published', '-created_at', '-id'], name='courses_cou_is_publ_d639ce_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userreward',
+            index=models.Index(fields=['user', '-awarded_at', '-id'], name='courses_use_user_id_1ad4a1_idx'),
+        ),
+    ]
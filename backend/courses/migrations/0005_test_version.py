@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_test_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='level',
+            field=models.CharField(choices=[('beginner', 'Beginner'), ('intermediate', 'Intermediate'), ('advanced', 'Advanced')], default='beginner', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['is_published', 'category', 'level'], name='courses_cou_is_publ_00d58f_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_course_level_facets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='thumbnail_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
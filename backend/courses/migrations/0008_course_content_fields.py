@@ -0,0 +1,39 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='duration',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='enrolled_students',
+            field=models.ManyToManyField(blank=True, related_name='enrolled_courses', through='courses.Enrollment', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='objectives',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='prerequisites',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='syllabus',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_course_content_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsubmission',
+            name='grading_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='testsubmission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending Review'), ('grading', 'Grading'), ('graded', 'Graded'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
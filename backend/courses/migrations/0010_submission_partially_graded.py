@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_submission_grading_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='testsubmission',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending Review'), ('grading', 'Grading'), ('graded', 'Graded'), ('partially_graded', 'Partially Graded'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+    ]
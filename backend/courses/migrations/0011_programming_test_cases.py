@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0010_submission_partially_graded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='ai_review',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='ProgrammingTestCase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('input', models.TextField(blank=True)),
+                ('expected_output', models.TextField()),
+                ('is_hidden', models.BooleanField(default=False)),
+                ('order', models.PositiveIntegerField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='test_cases', to='courses.question')),
+            ],
+            options={
+                'ordering': ['order', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0011_programming_test_cases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, unique=True)),
+                ('last_submission_id', models.IntegerField(default=0)),
+                ('regraded', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
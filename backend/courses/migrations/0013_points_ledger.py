@@ -0,0 +1,106 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:56
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import Counter
+from django.db import migrations, models
+
+
+
+def backfill_points(apps, schema_editor):
+    # Points were previously only recorded as UserReward strings
+    UserReward = apps.get_model('courses', 'UserReward')
+    PointsTransaction = apps.get_model('courses', 'PointsTransaction')
+    PointsBalance = apps.get_model('courses', 'PointsBalance')
+    CoursePointsBalance = apps.get_model('courses', 'CoursePointsBalance')
+
+    transactions = []
+    awarded = []
+    totals = Counter()
+    course_totals = Counter()
+    rewards = UserReward.objects.filter(reward_type='points').values_list(
+        'user_id', 'test_submission_id', 'test_submission__test__course_id', 'reward_value', 'awarded_at'
+    )
+    for user_id, submission_id, course_id, value, awarded_at in rewards.iterator():
+        try:
+            points = int(value)
+        except (TypeError, ValueError):
+            continue
+        transactions.append(PointsTransaction(
+            user_id=user_id,
+            course_id=course_id,
+            test_submission_id=submission_id,
+            points=points,
+            reason='test',
+        ))
+        awarded.append(awarded_at)
+        totals[user_id] += points
+        course_totals[user_id, course_id] += points
+
+    # auto_now_add would override created_at on insert, so set the award times afterwards
+    PointsTransaction.objects.bulk_create(transactions, batch_size=1000)
+    for transaction, awarded_at in zip(transactions, awarded):
+        transaction.created_at = awarded_at
+    PointsTransaction.objects.bulk_update(transactions, ['created_at'], batch_size=1000)
+
+    PointsBalance.objects.bulk_create(
+        [PointsBalance(user_id=user_id, points=points) for user_id, points in totals.items()],
+        batch_size=1000,
+    )
+    CoursePointsBalance.objects.bulk_create(
+        [
+            CoursePointsBalance(user_id=user_id, course_id=course_id, points=points)
+            for (user_id, course_id), points in course_totals.items()
+        ],
+        batch_size=1000,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0012_regrade_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointsBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='points_balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-points'], name='courses_poi_points_3c8712_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoursePointsBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_balances', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_points_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', '-points'], name='courses_cou_course__97292b_idx')],
+                'unique_together': {('user', 'course')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PointsTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField()),
+                ('reason', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='courses.course')),
+                ('test_submission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='courses.testsubmission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='points_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='courses_poi_created_bbea50_idx'), models.Index(fields=['course', 'created_at'], name='courses_poi_course__c75080_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_points, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0013_points_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='test',
+            name='feedback_mode',
+            field=models.CharField(choices=[('ai', 'AI'), ('template', 'Template')], default='ai', max_length=10),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-17 02:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0014_test_feedback_mode'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseNeighbor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbors', to='courses.course')),
+                ('neighbor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['course', '-score'], name='courses_cou_course__3b02ae_idx')],
+                'unique_together': {('course', 'neighbor')},
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# On SQLite, adding a field to Course (0006-0008) rebuilds courses_course,
+# which drops the full-text triggers created in 0003_course_search. Any
+# later migration that alters Course on SQLite must restore them the same way.
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER courses_course_fts_insert AFTER INSERT ON courses_course BEGIN
+        INSERT INTO courses_course_fts(rowid, title, description, category, tags)
+        VALUES (new.id, new.title, new.description, new.category, new.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_course_fts_delete AFTER DELETE ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, description, category, tags)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.tags);
+    END
+    """,
+    """
+    CREATE TRIGGER courses_course_fts_update
+    AFTER UPDATE OF title, description, category, tags ON courses_course BEGIN
+        INSERT INTO courses_course_fts(courses_course_fts, rowid, title, description, category, tags)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.tags);
+        INSERT INTO courses_course_fts(rowid, title, description, category, tags)
+        VALUES (new.id, new.title, new.description, new.category, new.tags);
+    END
+    """,
+]
+
+SQLITE_DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS courses_course_fts_update",
+    "DROP TRIGGER IF EXISTS courses_course_fts_delete",
+    "DROP TRIGGER IF EXISTS courses_course_fts_insert",
+]
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'courses_course_fts'")
+        if cursor.fetchone() is None:
+            # SQLite without FTS5; search is unindexed (see 0003_course_search)
+            return
+    for statement in SQLITE_DROP_TRIGGERS + SQLITE_TRIGGERS:
+        schema_editor.execute(statement, params=None)
+    # Index the courses created or edited while the triggers were missing
+    schema_editor.execute("INSERT INTO courses_course_fts(courses_course_fts) VALUES ('rebuild')", params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0015_course_neighbors'),
+    ]
+
+    operations = [
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
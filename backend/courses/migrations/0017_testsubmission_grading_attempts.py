@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 03:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0016_restore_course_search_triggers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testsubmission',
+            name='grading_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
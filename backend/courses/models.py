@@ -8,6 +8,7 @@ class User(AbstractUser):
     email = models.EmailField(_('email address'), unique=True)
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     avatar = models.ImageField(upload_to='avatars/', null=True, blank=True)
+    avatar_variants = models.JSONField(default=dict, blank=True)  # resized copies, see courses.images
     bio = models.TextField(blank=True)
     interests = models.JSONField(default=list, blank=True)
     
@@ -18,10 +19,17 @@ class User(AbstractUser):
         return self.email
 
 class Course(models.Model):
+    LEVEL_CHOICES = [
+        ('beginner', 'Beginner'),
+        ('intermediate', 'Intermediate'),
+        ('advanced', 'Advanced'),
+    ]
+
     title = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     thumbnail = models.ImageField(upload_to='course_thumbnails/')
+    thumbnail_variants = models.JSONField(default=dict, blank=True)  # resized copies, see courses.images
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     instructor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='courses')
@@ -30,6 +38,21 @@ class Course(models.Model):
     total_students = models.IntegerField(default=0)
     views_count = models.IntegerField(default=0)
     category = models.CharField(max_length=100, blank=True, null=True)
+    level = models.CharField(max_length=20, choices=LEVEL_CHOICES, default='beginner')
+    tags = models.JSONField(default=list, blank=True)
+    duration = models.CharField(max_length=50, blank=True)
+    prerequisites = models.TextField(blank=True)
+    objectives = models.TextField(blank=True)
+    syllabus = models.JSONField(default=list, blank=True)
+    enrolled_students = models.ManyToManyField(
+        User, through='Enrollment', related_name='enrolled_courses', blank=True
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_published', '-created_at', '-id']),
+            models.Index(fields=['is_published', 'category', 'level']),
+        ]
 
     def __str__(self):
         return self.title
@@ -115,12 +138,66 @@ class CourseView(models.Model):
     def __str__(self):
         return f"{self.user.email} viewed {self.course.title} at {self.viewed_at}"
 
+class CourseViewBucket(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='view_buckets')
+    hour = models.DateTimeField()
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('course', 'hour')
+        indexes = [models.Index(fields=['hour'])]
+
+    def __str__(self):
+        return f"{self.course.title} - {self.hour}: {self.views}"
+
+class PopularCourse(models.Model):
+    WINDOW_CHOICES = [
+        ('24h', 'Last 24 hours'),
+        ('7d', 'Last 7 days'),
+        ('30d', 'Last 30 days'),
+    ]
+
+    window = models.CharField(max_length=3, choices=WINDOW_CHOICES)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='popularity')
+    category = models.CharField(max_length=100, blank=True, null=True)
+    views = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('window', 'course')
+        indexes = [
+            models.Index(fields=['window', '-views']),
+            models.Index(fields=['window', 'category', '-views']),
+        ]
+
+    def __str__(self):
+        return f"{self.window} - {self.course.title}: {self.views}"
+
+class PopularityWindow(models.Model):
+    window = models.CharField(max_length=3, choices=PopularCourse.WINDOW_CHOICES, unique=True)
+    expired_before = models.DateTimeField()  # buckets older than this are no longer counted
+
+    def __str__(self):
+        return f"{self.window} expired before {self.expired_before}"
+
+class RegradeCheckpoint(models.Model):
+    scope = models.CharField(max_length=50, unique=True)  # e.g. "test:12" or "course:3"
+    last_submission_id = models.IntegerField(default=0)  # submissions up to this ID are done
+    regraded = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Regrade {self.scope} up to submission {self.last_submission_id}"
+
 class Test(models.Model):
     TEST_TYPE_CHOICES = [
         ('quiz', 'Quiz'),
         ('practice', 'Practice Exercise'),
         ('programming', 'Programming Assignment'),
     ]
+    FEEDBACK_MODE_CHOICES = [
+        ('ai', 'AI'),
+        ('template', 'Template'),
+    ]
 
     course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='tests')
     title = models.CharField(max_length=200)
@@ -132,6 +209,8 @@ class Test(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.IntegerField(default=1)  # bumped when a question or choice changes
+    feedback_mode = models.CharField(max_length=10, choices=FEEDBACK_MODE_CHOICES, default='ai')  # overall feedback
 
     def __str__(self):
         return f"{self.title} - {self.course.title}"
@@ -148,6 +227,7 @@ class Question(models.Model):
     question_type = models.CharField(max_length=20, choices=QUESTION_TYPE_CHOICES)
     question_text = models.TextField()
     points = models.IntegerField(default=1)
+    ai_review = models.BooleanField(default=False)  # programming: AI code review once all test cases pass
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -163,10 +243,25 @@ class Choice(models.Model):
     def __str__(self):
         return self.choice_text
 
+class ProgrammingTestCase(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='test_cases')
+    input = models.TextField(blank=True)  # fed to the program on stdin
+    expected_output = models.TextField()
+    is_hidden = models.BooleanField(default=False)  # not shown in feedback
+    order = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['order', 'id']
+
+    def __str__(self):
+        return f"Test case {self.order} for {self.question}"
+
 class TestSubmission(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending Review'),
+        ('grading', 'Grading'),
         ('graded', 'Graded'),
+        ('partially_graded', 'Partially Graded'),
         ('failed', 'Failed'),
     ]
 
@@ -175,6 +270,9 @@ class TestSubmission(models.Model):
     score = models.IntegerField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     submitted_at = models.DateTimeField(auto_now_add=True)
+    grading_started_at = models.DateTimeField(null=True, blank=True)
+    # Grading runs so far; partially graded submissions are retried up to GRADING_MAX_ATTEMPTS
+    grading_attempts = models.PositiveIntegerField(default=0)
     graded_at = models.DateTimeField(null=True, blank=True)
     ai_feedback = models.TextField(null=True, blank=True)
     ai_score = models.FloatField(null=True, blank=True)
@@ -207,5 +305,63 @@ class UserReward(models.Model):
     reward_value = models.CharField(max_length=100)  # Points amount, badge name, or certificate URL
     awarded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-awarded_at', '-id'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.reward_type} - {self.reward_value}" 
+
+class PointsTransaction(models.Model):
+    # Ledger of points earned; the balances below are running totals of it
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='points_transactions')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    test_submission = models.ForeignKey(TestSubmission, on_delete=models.CASCADE, null=True, blank=True)
+    points = models.IntegerField()
+    reason = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['course', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.points} points"
+
+class PointsBalance(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='points_balance')
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['-points'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.points} points"
+
+class CoursePointsBalance(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='course_points_balances')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='points_balances')
+    points = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'course')
+        indexes = [models.Index(fields=['course', '-points'])]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.points} points in {self.course.title}"
+
+class CourseNeighbor(models.Model):
+    # Item-item similarity from co-viewing and co-enrollment, rebuilt by `manage.py build_course_neighbors`
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='neighbors')
+    neighbor = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('course', 'neighbor')
+        indexes = [models.Index(fields=['course', '-score'])]
+
     def __str__(self):
-        return f"{self.user.username} - {self.reward_type} - {self.reward_value}" 
\ No newline at end of file
+        return f"{self.course.title} ~ {self.neighbor.title} ({self.score:.2f})"
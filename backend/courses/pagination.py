@@ -0,0 +1,129 @@
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination over a stable (timestamp, id) ordering.
+
+    Each page is fetched with a ``WHERE (created_at, id) < <cursor>`` seek on
+    an index, so page cost stays the same however deep the client pages.
+    Views whose timestamp field is not ``created_at`` set ``cursor_ordering``.
+
+    The cursor position holds a value for every ordering field, not just the
+    first, so rows that tie on the leading field (equal timestamps, equal
+    search ranks) are paged by id instead of by DRF's capped offset.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # Search results are paged in relevance order
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return getattr(view, 'cursor_ordering', self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            reverse, current_position = False, None
+        else:
+            _, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*[self._flip(order) for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            try:
+                queryset = queryset.filter(self._seek(current_position, reverse))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        # One extra row tells us whether there is a page after this one
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # Reverse cursors fetch backwards; hand the page back in forward order
+            self.page.reverse()
+            self.has_next = current_position is not None
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(str(instance[field_name]))
+            else:
+                values.append(str(getattr(instance, field_name)))
+        return json.dumps(values)
+
+    def _seek(self, position, reverse):
+        """
+        Build the filter for rows after ``position`` in the current ordering.
+
+        Args:
+            position: Encoded cursor position, one value per ordering field
+            reverse: Whether the cursor pages backwards
+
+        Returns:
+            Q: ``(a < x) OR (a = x AND b < y) ...``, with each comparison
+            flipped for ascending fields and reverse cursors
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        seek = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            seek |= equal & Q(**{f"{field_name}__{lookup}": value})
+            equal &= Q(**{field_name: value})
+        return seek
+
+    @staticmethod
+    def _flip(order):
+        return order[1:] if order.startswith('-') else f"-{order}"
@@ -0,0 +1,11 @@
+from rest_framework.parsers import JSONParser
+
+
+class BeaconJSONParser(JSONParser):
+    """
+    Parses JSON sent as text/plain.
+
+    ``navigator.sendBeacon`` posts strings as text/plain, and anything else
+    would need a CORS preflight that the browser never sends on page unload.
+    """
+    media_type = 'text/plain'
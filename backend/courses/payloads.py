@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Prefetch
+from .models import Question, Test
+from .serializers import TestSerializer
+
+
+def test_payload(test_id, version, updated_at) -> bytes:
+    """
+    The rendered JSON for a test, with its questions and choices.
+
+    Rendered once per test version and then served from the cache to every
+    student. Editing the test, or any of its questions or choices, changes
+    ``version`` or ``updated_at`` and so the key.
+
+    Args:
+        test_id: The test to render
+        version, updated_at: The test's current version stamp
+
+    Returns:
+        JSON bytes
+    """
+    key = f"courses:test_payload:{test_id}:{version}:{updated_at.timestamp()}"
+    payload = cache.get(key)
+    if payload is None:
+        # Questions in the order they are numbered in feedback (see answer_keys)
+        test = Test.objects.prefetch_related(
+            Prefetch('questions', queryset=Question.objects.order_by('id')), 'questions__choices'
+        ).get(id=test_id)
+        payload = JSONRenderer().render(TestSerializer(test).data)
+        cache.set(key, payload, settings.TEST_PAYLOAD_CACHE_TIMEOUT)
+    return payload
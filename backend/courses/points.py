@@ -0,0 +1,250 @@
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import User, PointsTransaction, PointsBalance, CoursePointsBalance
+
+ALL_TIME = 'all'
+WINDOWS = {
+    ALL_TIME: None,
+    '7d': 7,
+    '30d': 30,
+}
+
+# Daily sorted sets are kept a little longer than the largest window
+DAY_KEY_TTL = (max(days for days in WINDOWS.values() if days) + 2) * 24 * 60 * 60
+# How long a window's union of daily sets is reused before being rebuilt
+WINDOW_KEY_TTL = 60
+# How long a rebuild's temporary sets live if it dies before swapping them in
+REBUILD_KEY_TTL = 60 * 60
+
+_redis_client = None
+
+
+def get_redis():
+    """Redis client for the leaderboard sorted sets, or None without REDIS_URL."""
+    global _redis_client
+    if not settings.REDIS_URL:
+        return None
+    if _redis_client is None:
+        import redis
+        _redis_client = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis_client
+
+
+def _scope_key(course_id=None):
+    return f"points:course:{course_id}" if course_id else 'points:global'
+
+
+def _day_key(day, course_id=None):
+    return f"{_scope_key(course_id)}:day:{day:%Y%m%d}"
+
+
+def _add_points(model, lookup, points):
+    # Insert, ignoring conflicts, then increment, so concurrent awards add up
+    model.objects.bulk_create([model(**lookup)], ignore_conflicts=True)
+    model.objects.filter(**lookup).update(points=F('points') + points, updated_at=timezone.now())
+
+
+def _index_points(user_id, course_id, points, day):
+    client = get_redis()
+    if client is None:
+        return
+    import redis
+    try:
+        pipe = client.pipeline(transaction=False)
+        for scope in (None, course_id) if course_id else (None,):
+            pipe.zincrby(_scope_key(scope), points, user_id)
+            pipe.zincrby(_day_key(day, scope), points, user_id)
+            pipe.expire(_day_key(day, scope), DAY_KEY_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        # The ledger is authoritative; 'manage.py rebuild_points_leaderboard' restores the sets
+        print(f"Error updating points leaderboard: {str(e)}")
+
+
+def award_points(user, points: int, course=None, test_submission=None, reason: str = '') -> PointsTransaction:
+    """
+    Record points in the ledger and add them to the user's balances.
+
+    The ledger row and the global and per-course balances are written in one
+    transaction; the Redis sorted sets are updated after it commits.
+
+    Args:
+        user: The user earning the points
+        points: Number of points
+        course: Course the points were earned in, if any
+        test_submission: Submission that earned them, if any
+        reason: Short description for the ledger
+
+    Returns:
+        The ledger entry
+    """
+    with transaction.atomic():
+        entry = PointsTransaction.objects.create(
+            user=user,
+            course=course,
+            test_submission=test_submission,
+            points=points,
+            reason=reason
+        )
+        _add_points(PointsBalance, {'user_id': user.id}, points)
+        if course is not None:
+            _add_points(CoursePointsBalance, {'user_id': user.id, 'course_id': course.id}, points)
+
+        course_id = course.id if course is not None else None
+        day = timezone.localdate(entry.created_at)
+        transaction.on_commit(lambda: _index_points(user.id, course_id, points, day))
+    return entry
+
+
+def _window_key(client, window, course_id):
+    # Union of the window's daily sets, cached briefly
+    today = timezone.localdate()
+    key = f"{_scope_key(course_id)}:window:{window}:{today:%Y%m%d}"
+    if not client.exists(key):
+        days = [_day_key(today - timedelta(days=offset), course_id) for offset in range(WINDOWS[window])]
+        pipe = client.pipeline()
+        pipe.zunionstore(key, days)
+        pipe.expire(key, WINDOW_KEY_TTL)
+        pipe.execute()
+    return key
+
+
+def _redis_leaderboard(client, window, course_id, limit, user):
+    key = _scope_key(course_id) if window == ALL_TIME else _window_key(client, window, course_id)
+    pipe = client.pipeline(transaction=False)
+    pipe.zrevrange(key, 0, limit - 1, withscores=True)
+    if user is not None:
+        pipe.zrevrank(key, user.id)
+        pipe.zscore(key, user.id)
+    replies = pipe.execute()
+
+    top = [(int(user_id), int(score)) for user_id, score in replies[0]]
+    me = None
+    if user is not None and replies[1] is not None:
+        me = (replies[1] + 1, int(replies[2]))
+    return top, me
+
+
+def _db_leaderboard(window, course_id, limit, user):
+    if window == ALL_TIME:
+        if course_id:
+            totals = CoursePointsBalance.objects.filter(course_id=course_id)
+        else:
+            totals = PointsBalance.objects.all()
+        totals = totals.values('user_id').annotate(total=F('points'))
+    else:
+        since = timezone.now() - timedelta(days=WINDOWS[window])
+        totals = PointsTransaction.objects.filter(created_at__gte=since)
+        if course_id:
+            totals = totals.filter(course_id=course_id)
+        totals = totals.values('user_id').annotate(total=Sum('points'))
+
+    top = [
+        (row['user_id'], row['total'])
+        for row in totals.order_by('-total', 'user_id')[:limit]
+    ]
+    me = None
+    if user is not None:
+        mine = next(iter(totals.filter(user_id=user.id)), None)
+        if mine is not None:
+            rank = totals.filter(total__gt=mine['total']).count() + 1
+            me = (rank, mine['total'])
+    return top, me
+
+
+def points_leaderboard(window=ALL_TIME, course_id=None, limit=10, user=None):
+    """
+    Top users by points, globally or within a course, all-time or over a
+    rolling window.
+
+    Served from Redis sorted sets when REDIS_URL is set, so top-N and rank
+    lookups are logarithmic; otherwise from the materialized balances (and,
+    for windows, the ledger).
+
+    Args:
+        window: One of WINDOWS
+        course_id: Restrict to points earned in this course
+        limit: Number of users to return
+        user: Also report this user's rank and points
+
+    Returns:
+        Dict with 'results' (rank, user_id, username, points) and 'me'
+    """
+    client = get_redis()
+    top = me = None
+    if client is not None:
+        import redis
+        try:
+            top, me = _redis_leaderboard(client, window, course_id, limit, user)
+        except redis.RedisError as e:
+            print(f"Error reading points leaderboard: {str(e)}")
+    if top is None:
+        top, me = _db_leaderboard(window, course_id, limit, user)
+
+    usernames = dict(User.objects.filter(id__in=[user_id for user_id, _ in top]).values_list('id', 'username'))
+    return {
+        'window': window,
+        'course': course_id,
+        'results': [
+            {'rank': rank, 'user_id': user_id, 'username': usernames.get(user_id), 'points': points}
+            for rank, (user_id, points) in enumerate(top, start=1)
+        ],
+        'me': {'rank': me[0], 'points': me[1]} if me else None,
+    }
+
+
+def rebuild_leaderboard_sets():
+    """
+    Reload every leaderboard sorted set from the database, e.g. after Redis
+    was flushed.
+
+    The sets are built under temporary names and renamed over the live keys
+    in one transaction, so readers never see a missing or half-filled set.
+
+    Returns:
+        Number of keys written, or None without REDIS_URL
+    """
+    client = get_redis()
+    if client is None:
+        return None
+
+    prefix = f"rebuild:{uuid.uuid4().hex}:"
+    pipe = client.pipeline(transaction=False)
+    scope_keys, day_keys = set(), set()
+    for user_id, points in PointsBalance.objects.values_list('user_id', 'points').iterator():
+        pipe.zadd(prefix + _scope_key(), {user_id: points})
+        scope_keys.add(_scope_key())
+    for user_id, course_id, points in CoursePointsBalance.objects.values_list('user_id', 'course_id', 'points').iterator():
+        pipe.zadd(prefix + _scope_key(course_id), {user_id: points})
+        scope_keys.add(_scope_key(course_id))
+
+    since = timezone.now() - timedelta(seconds=DAY_KEY_TTL)
+    for entry in PointsTransaction.objects.filter(created_at__gte=since).values('user_id', 'course_id', 'points', 'created_at').iterator():
+        day = timezone.localdate(entry['created_at'])
+        for scope in (None, entry['course_id']) if entry['course_id'] else (None,):
+            pipe.zincrby(prefix + _day_key(day, scope), entry['points'], entry['user_id'])
+            day_keys.add(_day_key(day, scope))
+
+    # Temporary sets expire on their own if the swap never happens
+    for key in scope_keys | day_keys:
+        pipe.expire(prefix + key, REBUILD_KEY_TTL)
+    pipe.execute()
+
+    keys = scope_keys | day_keys
+    stale = [key for key in client.scan_iter(match='points:*') if key.decode() not in keys]
+    swap = client.pipeline(transaction=True)
+    for key in scope_keys:
+        swap.rename(prefix + key, key)
+        swap.persist(key)
+    for key in day_keys:
+        swap.rename(prefix + key, key)
+        swap.expire(key, DAY_KEY_TTL)
+    # Sets with no rows left, and window unions built from the old day sets
+    if stale:
+        swap.delete(*stale)
+    swap.execute()
+    return len(keys)
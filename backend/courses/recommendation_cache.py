@@ -0,0 +1,74 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+from accounts.services import get_course_recommendations
+from .background import run_in_background
+from .conditional import catalog_version
+from .models import User, TestSubmission
+
+
+def _inputs_key(user_id):
+    return f"recommendations:inputs:{user_id}"
+
+
+def _result_key(user_id, with_tests):
+    return f"recommendations:user:{user_id}:{int(with_tests)}"
+
+
+def inputs_version(user_id) -> float:
+    """Version stamp for everything a user's recommendations are computed from."""
+    return cache.get_or_set(_inputs_key(user_id), time.time, timeout=None)
+
+
+def invalidate_user_recommendations(*user_ids):
+    """Mark users' recommendations as stale, e.g. after a new view, enrollment or submission."""
+    now = time.time()
+    cache.set_many({_inputs_key(user_id): now for user_id in user_ids}, timeout=None)
+
+
+def _compute(user, with_tests):
+    test_submissions = TestSubmission.objects.filter(user=user) if with_tests else None
+    return get_course_recommendations(user, test_submissions)
+
+
+def _refresh(user_id, with_tests, stamp):
+    try:
+        user = User.objects.get(id=user_id)
+        recommendations = _compute(user, with_tests)
+        cache.set(
+            _result_key(user_id, with_tests),
+            {'stamp': stamp, 'recommendations': recommendations},
+            settings.RECOMMENDATION_CACHE_TIMEOUT
+        )
+    finally:
+        cache.delete(f"{_result_key(user_id, with_tests)}:refreshing")
+
+
+def cached_course_recommendations(user, with_tests=False):
+    """
+    Course recommendations for a user, cached until their inputs change.
+
+    The cached result is stamped with the user's inputs version and the
+    catalog version. A stale result is still returned, and a single
+    background task recomputes it; only a user with nothing cached waits
+    for the computation.
+
+    Args:
+        user: The user to recommend for
+        with_tests: Also pass the user's test submissions to the recommender
+
+    Returns:
+        List of recommendation dicts, as get_course_recommendations
+    """
+    stamp = (inputs_version(user.id), catalog_version())
+    key = _result_key(user.id, with_tests)
+    cached = cache.get(key)
+
+    if cached is None:
+        recommendations = _compute(user, with_tests)
+        cache.set(key, {'stamp': stamp, 'recommendations': recommendations}, settings.RECOMMENDATION_CACHE_TIMEOUT)
+        return recommendations
+
+    if cached['stamp'] != stamp and cache.add(f"{key}:refreshing", 1, timeout=settings.RECOMMENDATION_REFRESH_TIMEOUT):
+        run_in_background(_refresh, user.id, with_tests, stamp)
+    return cached['recommendations']
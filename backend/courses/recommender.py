@@ -0,0 +1,125 @@
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from .models import Course, CourseNeighbor, CourseView, Enrollment
+
+# How much an enrollment counts relative to a view
+ENROLLMENT_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+
+
+def _interactions():
+    """Map each (user_id, course_id) pair to its weight: ENROLLMENT_WEIGHT if enrolled, else VIEW_WEIGHT."""
+    weights = {}
+    for user_id, course_id in CourseView.objects.values_list('user_id', 'course_id').iterator():
+        weights[user_id, course_id] = VIEW_WEIGHT
+    for user_id, course_id in Enrollment.objects.values_list('user_id', 'course_id').iterator():
+        weights[user_id, course_id] = ENROLLMENT_WEIGHT
+    return weights
+
+
+def build_course_neighbors(k=None):
+    """
+    Rebuild the item-item neighbor table from views and enrollments.
+
+    Builds a sparse user x course matrix, takes the cosine similarity between
+    course columns and stores each course's top ``k`` neighbors, replacing
+    the previous table in one transaction.
+
+    Args:
+        k: Neighbors kept per course (defaults to RECOMMENDER_NEIGHBORS)
+
+    Returns:
+        Number of neighbor rows written
+    """
+    import numpy as np
+    from scipy import sparse
+
+    k = k or settings.RECOMMENDER_NEIGHBORS
+    weights = _interactions()
+    course_ids = sorted({course_id for _, course_id in weights})
+    user_ids = sorted({user_id for user_id, _ in weights})
+    neighbors = []
+
+    if course_ids:
+        course_index = {course_id: i for i, course_id in enumerate(course_ids)}
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        rows = np.fromiter((user_index[user_id] for user_id, _ in weights), dtype=np.int32, count=len(weights))
+        cols = np.fromiter((course_index[course_id] for _, course_id in weights), dtype=np.int32, count=len(weights))
+        data = np.fromiter(weights.values(), dtype=np.float32, count=len(weights))
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(user_ids), len(course_ids)))
+
+        # Cosine similarity between course columns
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0))).ravel()
+        norms[norms == 0] = 1
+        normalized = matrix @ sparse.diags(1 / norms)
+        similarity = (normalized.T @ normalized).tocsr()
+        similarity.setdiag(0)
+        similarity.eliminate_zeros()
+
+        for i in range(similarity.shape[0]):
+            start, end = similarity.indptr[i], similarity.indptr[i + 1]
+            scores = similarity.data[start:end]
+            columns = similarity.indices[start:end]
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                scores, columns = scores[top], columns[top]
+            neighbors.extend(
+                CourseNeighbor(course_id=course_ids[i], neighbor_id=course_ids[j], score=float(score))
+                for j, score in zip(columns, scores)
+            )
+
+    with transaction.atomic():
+        CourseNeighbor.objects.all().delete()
+        CourseNeighbor.objects.bulk_create(neighbors, batch_size=1000)
+    return len(neighbors)
+
+
+def recommend_courses(user, limit=5):
+    """
+    Recommend courses from the neighbors of the courses a user has viewed or
+    enrolled in: O(k * history), no model or AI call at request time.
+
+    Args:
+        user: The user to recommend for
+        limit: Number of courses to return
+
+    Returns:
+        List of (course, score between 0 and 1, ID of the history course that contributed most)
+    """
+    history = {}
+    for course_id in CourseView.objects.filter(user=user).values_list('course_id', flat=True):
+        history[course_id] = VIEW_WEIGHT
+    for course_id in Enrollment.objects.filter(user=user).values_list('course_id', flat=True):
+        history[course_id] = ENROLLMENT_WEIGHT
+    if not history:
+        return []
+
+    scores = defaultdict(float)
+    because = {}
+    for course_id, neighbor_id, score in CourseNeighbor.objects.filter(
+        course_id__in=history
+    ).values_list('course_id', 'neighbor_id', 'score'):
+        if neighbor_id in history:
+            continue
+        contribution = score * history[course_id]
+        scores[neighbor_id] += contribution
+        if contribution > because.get(neighbor_id, (0, None))[0]:
+            because[neighbor_id] = (contribution, course_id)
+
+    if not scores:
+        return []
+
+    # Unpublished candidates are dropped before ranking, so they cannot take up the limit
+    published = Course.objects.filter(id__in=scores, is_published=True).values_list('id', flat=True)
+    ranked = sorted(published, key=scores.get, reverse=True)[:limit]
+    if not ranked:
+        return []
+
+    courses = Course.objects.in_bulk(ranked)
+    best = scores[ranked[0]]
+    return [
+        (courses[course_id], min(scores[course_id] / best, 1.0), because[course_id][1])
+        for course_id in ranked
+        if course_id in courses
+    ]
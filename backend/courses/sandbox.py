@@ -0,0 +1,239 @@
+import json
+import os
+import pwd
+import queue
+import selectors
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sandbox_worker.py')
+
+# Extra seconds to wait for a worker's reply beyond the job's own wall limit
+REPLY_GRACE = 5
+
+
+class SandboxError(Exception):
+    """The sandbox itself failed (not the submitted code)."""
+
+
+def _sandbox_user():
+    """
+    The (uid, gid) sandbox workers run as. Refuses root and the user the
+    application itself runs as, whose files the workers must not share.
+    """
+    try:
+        entry = pwd.getpwnam(settings.SANDBOX_USER)
+    except KeyError:
+        raise SandboxError(f"SANDBOX_USER {settings.SANDBOX_USER!r} does not exist")
+    if entry.pw_uid == 0 or entry.pw_gid == 0:
+        raise SandboxError("SANDBOX_USER must not be root")
+    if entry.pw_uid == os.geteuid():
+        raise SandboxError("SANDBOX_USER must differ from the user running the application")
+    return entry.pw_uid, entry.pw_gid
+
+
+class SandboxWorker:
+    """One pre-warmed ``sandbox_worker.py`` process, handling one job at a time."""
+
+    def __init__(self):
+        uid, gid = _sandbox_user()
+        with open(WORKER_SCRIPT) as f:
+            # Passed as source, so the sandbox user needs no access to the project
+            source = f.read()
+        try:
+            self.process = subprocess.Popen(
+                [settings.SANDBOX_PYTHON or sys.executable, '-I', '-S', '-c', source],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd='/',
+                env={'PATH': '/usr/bin:/bin', 'LANG': 'C.UTF-8'},
+                user=uid,
+                group=gid,
+                extra_groups=[],
+            )
+        except OSError as e:
+            # e.g. the application is not allowed to switch to SANDBOX_USER
+            raise SandboxError(f"Could not start sandbox worker: {str(e)}") from e
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def run(self, job):
+        self.process.stdin.write((json.dumps(job) + '\n').encode())
+        self.process.stdin.flush()
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self.process.stdout, selectors.EVENT_READ)
+            if not selector.select(job['wall_seconds'] + REPLY_GRACE):
+                raise SandboxError("Sandbox worker did not reply")
+        line = self.process.stdout.readline()
+        if not line:
+            raise SandboxError("Sandbox worker exited")
+        result = json.loads(line)
+        if result['status'] == 'isolation_failed':
+            # Never fall back to running the code unconfined
+            raise SandboxError(result['stdout'])
+        return result
+
+    def stop(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+
+
+class SandboxPool:
+    """
+    A fixed set of pre-warmed workers. Jobs wait for a free worker, and a
+    worker that fails is replaced rather than reused.
+    """
+
+    def __init__(self, size):
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(SandboxWorker())
+
+    def run(self, job, deadline_at=None):
+        # Only start (or wait for a worker for) a job that can finish by the deadline
+        wait = None if deadline_at is None else deadline_at - job['wall_seconds'] - time.monotonic()
+        try:
+            if wait is not None and wait < 0:
+                raise queue.Empty
+            worker = self.idle.get(timeout=wait)
+        except queue.Empty:
+            raise SandboxError('The grading deadline passed before the code could be run')
+        if not worker.alive():
+            # Died while idle; don't fail the job for it
+            worker = self._replace(worker)
+        try:
+            return worker.run(job)
+        except (OSError, ValueError, SandboxError) as e:
+            worker.stop()
+            raise SandboxError(str(e)) from e
+        finally:
+            if not worker.alive():
+                worker = self._replace(worker)
+            self.idle.put(worker)
+
+    def _replace(self, worker):
+        worker.stop()
+        try:
+            return SandboxWorker()
+        except SandboxError as e:
+            # Keep the dead worker's slot; the next job using it fails and retries the restart
+            print(f"Error restarting sandbox worker: {str(e)}")
+            return worker
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_sandbox_pool():
+    # One pool per worker process; forked workers must not share pipes.
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool_pid != pid:
+        with _pool_lock:
+            if _pool_pid != pid:
+                _pool = SandboxPool(settings.SANDBOX_WORKERS)
+                _pool_pid = pid
+    return _pool
+
+
+def run_code(code: str, stdin: str = '', deadline_at=None):
+    """
+    Run Python ``code`` in the sandbox with ``stdin`` as its input.
+
+    The program runs in a forked child of a pre-warmed worker running as
+    SANDBOX_USER, with CPU time, address space, process count and output
+    limits, no writable files and an empty environment. It has its own
+    user, mount, network and PID namespaces: it sees only a read-only copy
+    of the interpreter's directories, has no network and cannot see or
+    signal other processes. If the host does not allow that (e.g. user
+    namespaces are disabled), SandboxError is raised and nothing is run.
+
+    Args:
+        code: Python source to run
+        stdin: Text fed to the program's standard input
+        deadline_at: time.monotonic() value the run must finish by; the
+            job is not started if its wall limit would pass it
+
+    Returns:
+        Dict with status ('ok', 'error', 'timeout', 'memory_limit',
+        'output_limit' or 'crashed'), combined stdout/stderr and elapsed seconds
+
+    Raises:
+        SandboxError: If the sandbox itself failed, or could not run the
+            code before the deadline
+    """
+    return get_sandbox_pool().run({
+        'code': code,
+        'stdin': stdin,
+        'cpu_seconds': settings.SANDBOX_CPU_SECONDS,
+        'wall_seconds': settings.SANDBOX_WALL_SECONDS,
+        'memory_bytes': settings.SANDBOX_MEMORY_MB * 1024 * 1024,
+        'max_processes': settings.SANDBOX_MAX_PROCESSES,
+        'output_limit': settings.SANDBOX_OUTPUT_LIMIT,
+    }, deadline_at)
+
+
+def _printable(text):
+    # Program output is untrusted: drop control characters (e.g. terminal
+    # escapes) before it is shown to anyone
+    return ''.join(char for char in text if char.isprintable() or char in '\n\t')
+
+
+def _normalize_output(text):
+    return '\n'.join(line.rstrip() for line in text.strip().splitlines())
+
+
+def run_test_cases(code: str, test_cases, points: int, deadline_at=None):
+    """
+    Grade a program against instructor-defined test cases.
+
+    Args:
+        code: The submitted Python source
+        test_cases: ProgrammingTestCase objects, in order
+        points: Points for passing every case
+        deadline_at: time.monotonic() value every case must finish by
+
+    Returns:
+        Tuple of (score, feedback); the score is proportional to cases passed
+
+    Raises:
+        SandboxError: If the sandbox failed, or the deadline came before
+            every case had run
+    """
+    passed = 0
+    failures = []
+    for number, test_case in enumerate(test_cases, start=1):
+        result = run_code(code, test_case.input, deadline_at)
+        if result['status'] == 'ok' and _normalize_output(result['stdout']) == _normalize_output(test_case.expected_output):
+            passed += 1
+            continue
+
+        if test_case.is_hidden:
+            failures.append(f"Test {number} (hidden): failed.")
+        elif result['status'] == 'ok':
+            failures.append(
+                f"Test {number}: wrong output.\n"
+                f"Input:\n{test_case.input[:500]}\n"
+                f"Expected:\n{test_case.expected_output[:500]}\n"
+                f"Got:\n{_printable(result['stdout'][:500])}"
+            )
+        else:
+            failures.append(
+                f"Test {number}: {result['status'].replace('_', ' ')}.\n{_printable(result['stdout'][-1000:])}"
+            )
+
+    total = len(test_cases)
+    score = points * passed // total
+    feedback = f"Passed {passed}/{total} test cases."
+    if failures:
+        feedback += "\n\n" + "\n\n".join(failures)
+    return score, feedback
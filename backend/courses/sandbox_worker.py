@@ -0,0 +1,306 @@
+"""
+Sandbox worker process for running submitted Python code.
+
+Started by courses.sandbox with ``python -I -S`` as a dedicated
+unprivileged user and kept alive, so an interpreter is already warm when a
+job arrives. Each job is a JSON line on stdin; the worker forks, confines
+the child and runs the code there, then writes one JSON result line to
+stdout.
+
+The child gets resource limits (CPU, memory, processes, no file writes)
+and its own user, mount, network, PID, IPC and UTS namespaces: its root
+is a read-only view of the system directories the interpreter needs, it
+has no network interfaces, it cannot see other processes and it holds no
+capabilities. If any of that cannot be set up the job is not run.
+
+This module must not import Django or anything else from the project.
+"""
+import ctypes
+import json
+import os
+import resource
+import selectors
+import signal
+import sys
+import threading
+import time
+
+
+CLONE_NEWNS = 0x00020000
+CLONE_NEWUTS = 0x04000000
+CLONE_NEWIPC = 0x08000000
+CLONE_NEWUSER = 0x10000000
+CLONE_NEWPID = 0x20000000
+CLONE_NEWNET = 0x40000000
+MS_RDONLY = 0x1
+MS_NOSUID = 0x2
+MS_NODEV = 0x4
+MS_NOEXEC = 0x8
+MS_REMOUNT = 0x20
+MS_BIND = 0x1000
+MS_REC = 0x4000
+MS_PRIVATE = 0x40000
+MNT_DETACH = 0x2
+PR_SET_PDEATHSIG = 1
+PR_CAPBSET_DROP = 24
+PR_SET_NO_NEW_PRIVS = 38
+SYS_PIVOT_ROOT = {'x86_64': 155, 'aarch64': 41}
+CAP_LAST = 63
+
+# Exit status of a child whose confinement failed; its code was not run
+ISOLATION_FAILED = 125
+
+# Directories visible (read-only) to submitted code: the interpreter and its libraries
+READ_ONLY_PATHS = ('/usr', '/lib', '/lib64', '/bin', sys.base_prefix, sys.base_exec_prefix)
+NEW_ROOT = '/tmp'
+
+_libc = ctypes.CDLL(None, use_errno=True)
+
+
+class IsolationError(Exception):
+    pass
+
+
+def _check(result, what):
+    if result != 0:
+        errno = ctypes.get_errno()
+        raise IsolationError(f"{what}: {os.strerror(errno)}")
+
+
+def _limit(child_resource, value):
+    resource.setrlimit(child_resource, (value, value))
+
+
+def _mount(source, target, fstype, flags, data=None):
+    _check(
+        _libc.mount(
+            source and source.encode(), target.encode(), fstype and fstype.encode(),
+            flags, data and data.encode()
+        ),
+        f"mount {target}"
+    )
+
+
+def _read_only_paths():
+    paths = []
+    for path in sorted({os.path.realpath(path) for path in READ_ONLY_PATHS}):
+        if os.path.isdir(path) and not any(path.startswith(parent + '/') for parent in paths):
+            paths.append(path)
+    return paths
+
+
+def _enter_namespaces():
+    uid, gid = os.getuid(), os.getgid()
+    _check(
+        _libc.unshare(CLONE_NEWUSER | CLONE_NEWNS | CLONE_NEWNET | CLONE_NEWPID | CLONE_NEWIPC | CLONE_NEWUTS),
+        "unshare"
+    )
+    with open('/proc/self/setgroups', 'w') as f:
+        f.write('deny')
+    with open('/proc/self/uid_map', 'w') as f:
+        f.write(f"0 {uid} 1")
+    with open('/proc/self/gid_map', 'w') as f:
+        f.write(f"0 {gid} 1")
+    # No nested user namespaces, which would hand the code fresh capabilities
+    with open('/proc/sys/user/max_user_namespaces', 'w') as f:
+        f.write('0')
+
+
+def _change_root():
+    # Build a fresh root holding only read-only bind mounts, then pivot into
+    # it and detach the old root, so nothing else on the host is reachable.
+    _mount(None, '/', None, MS_REC | MS_PRIVATE)
+    _mount('tmpfs', NEW_ROOT, 'tmpfs', MS_NOSUID | MS_NODEV, 'size=64k,mode=755')
+    for path in _read_only_paths():
+        target = NEW_ROOT + path
+        os.makedirs(target, exist_ok=True)
+        _mount(path, target, None, MS_BIND | MS_REC)
+        _mount(None, target, None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV)
+    os.mkdir(NEW_ROOT + '/old_root')
+    _mount(None, NEW_ROOT, None, MS_BIND | MS_REMOUNT | MS_RDONLY | MS_NOSUID | MS_NODEV | MS_NOEXEC)
+
+    number = SYS_PIVOT_ROOT.get(os.uname().machine)
+    if number is None:
+        raise IsolationError(f"pivot_root: unsupported architecture {os.uname().machine}")
+    _check(_libc.syscall(number, NEW_ROOT.encode(), (NEW_ROOT + '/old_root').encode()), "pivot_root")
+    os.chdir('/')
+    _check(_libc.umount2(b'/old_root', MNT_DETACH), "umount old root")
+
+
+class _CapHeader(ctypes.Structure):
+    _fields_ = [('version', ctypes.c_uint32), ('pid', ctypes.c_int)]
+
+
+class _CapData(ctypes.Structure):
+    _fields_ = [('effective', ctypes.c_uint32), ('permitted', ctypes.c_uint32), ('inheritable', ctypes.c_uint32)]
+
+
+def _drop_privileges():
+    _check(_libc.prctl(PR_SET_NO_NEW_PRIVS, 1, 0, 0, 0), "no_new_privs")
+    for capability in range(CAP_LAST + 1):
+        # Capabilities this kernel doesn't know about fail with EINVAL
+        _libc.prctl(PR_CAPBSET_DROP, capability, 0, 0, 0)
+    header = _CapHeader(0x20080522, 0)
+    data = (_CapData * 2)()
+    _check(_libc.capset(ctypes.byref(header), data), "capset")
+
+
+def _confine(cpu_seconds, memory_bytes, max_processes):
+    os.setsid()
+    _limit(resource.RLIMIT_CPU, cpu_seconds)
+    _limit(resource.RLIMIT_AS, memory_bytes)
+    _limit(resource.RLIMIT_FSIZE, 0)
+    _limit(resource.RLIMIT_CORE, 0)
+    _limit(resource.RLIMIT_NPROC, max_processes)
+    os.environ.clear()
+    _enter_namespaces()
+
+    # The first process forked in the new PID namespace is its init: when
+    # it exits, everything it started is killed with it.
+    pid = os.fork()
+    if pid:
+        _, wait_status = os.waitpid(pid, 0)
+        if os.WIFSIGNALED(wait_status):
+            # Pass the signal on, so the worker can tell a CPU timeout from an error
+            sig = os.WTERMSIG(wait_status)
+            if sig != signal.SIGKILL:
+                signal.signal(sig, signal.SIG_DFL)
+            os.kill(os.getpid(), sig)
+            os._exit(1)
+        os._exit(os.WEXITSTATUS(wait_status))
+    # Die with the parent, which is what the worker kills on a timeout
+    _check(_libc.prctl(PR_SET_PDEATHSIG, signal.SIGKILL, 0, 0, 0), "pdeathsig")
+    _change_root()
+    _drop_privileges()
+
+
+def _run_child(code, in_fd, out_fd, cpu_seconds, memory_bytes, max_processes):
+    os.dup2(in_fd, 0)
+    os.dup2(out_fd, 1)
+    os.dup2(out_fd, 2)
+    os.closerange(3, 1024)
+    sys.stdin = open(0, 'r', closefd=False)
+    sys.stdout = open(1, 'w', closefd=False)
+    sys.stderr = sys.stdout
+
+    try:
+        _confine(cpu_seconds, memory_bytes, max_processes)
+    except BaseException as e:
+        sys.stdout.write(f"Sandbox isolation failed: {e}\n")
+        sys.stdout.flush()
+        os._exit(ISOLATION_FAILED)
+
+    exit_code = 0
+    try:
+        exec(compile(code, '<submission>', 'exec'), {'__name__': '__main__'})
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        import traceback
+        # Start the traceback at the submission, not this module
+        etype, value, tb = sys.exc_info()
+        traceback.print_exception(etype, value, tb.tb_next)
+        exit_code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+        except BaseException:
+            pass
+    # The isolation failure status is reserved for the sandbox itself
+    os._exit(1 if exit_code == ISOLATION_FAILED else exit_code)
+
+
+def _feed(fd, data):
+    try:
+        with open(fd, 'wb') as pipe:
+            pipe.write(data)
+    except OSError:
+        # The program exited without reading all of its input
+        pass
+
+
+def run_job(job):
+    cpu_seconds = job['cpu_seconds']
+    wall_seconds = job['wall_seconds']
+    output_limit = job['output_limit']
+
+    in_r, in_w = os.pipe()
+    out_r, out_w = os.pipe()
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        os.close(in_w)
+        os.close(out_r)
+        _run_child(job['code'], in_r, out_w, cpu_seconds, job['memory_bytes'], job['max_processes'])
+    os.close(in_r)
+    os.close(out_w)
+
+    feeder = threading.Thread(target=_feed, args=(in_w, job['stdin'].encode()), daemon=True)
+    feeder.start()
+
+    output = bytearray()
+    status = None
+    selector = selectors.DefaultSelector()
+    selector.register(out_r, selectors.EVENT_READ)
+    deadline = started + wall_seconds
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            status = 'timeout'
+            break
+        if not selector.select(remaining):
+            continue
+        chunk = os.read(out_r, 65536)
+        if not chunk:
+            break
+        output += chunk
+        if len(output) > output_limit:
+            status = 'output_limit'
+            break
+    selector.close()
+    os.close(out_r)
+
+    if status is not None:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    _, wait_status = os.waitpid(pid, 0)
+    elapsed = time.monotonic() - started
+
+    if status is None:
+        if os.WIFEXITED(wait_status) and os.WEXITSTATUS(wait_status) == ISOLATION_FAILED \
+                and output.startswith(b'Sandbox isolation failed'):
+            status = 'isolation_failed'
+        elif os.WIFSIGNALED(wait_status):
+            sig = os.WTERMSIG(wait_status)
+            status = 'timeout' if sig in (signal.SIGXCPU, signal.SIGKILL) else 'crashed'
+        elif os.WEXITSTATUS(wait_status) != 0:
+            status = 'memory_limit' if b'MemoryError' in output else 'error'
+        else:
+            status = 'ok'
+
+    return {
+        'status': status,
+        'stdout': output[:output_limit].decode('utf-8', 'replace'),
+        'elapsed': round(elapsed, 3),
+    }
+
+
+def main():
+    if os.getuid() == 0 or os.geteuid() == 0:
+        sys.stdout.write(json.dumps({'status': 'isolation_failed', 'stdout': 'Sandbox worker must not run as root', 'elapsed': 0}) + '\n')
+        sys.stdout.flush()
+        sys.exit(1)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for line in sys.stdin.buffer:
+        try:
+            result = run_job(json.loads(line))
+        except Exception as e:
+            result = {'status': 'crashed', 'stdout': f"Sandbox error: {e}", 'elapsed': 0}
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
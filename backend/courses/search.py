@@ -0,0 +1,101 @@
+import re
+from django.db import connection
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+# The indexes themselves are created and kept current by database triggers
+# (see migrations 0003_course_search and 0016_restore_course_search_triggers),
+# so saving a Course is all it takes.
+
+
+class PostgresSearchBackend:
+    """tsvector/GIN ranking, plus trigram word similarity on the title for typos."""
+
+    def search(self, queryset, query):
+        match = RawSQL(
+            '("courses_course"."search_document" @@ websearch_to_tsquery(\'english\', %s) '
+            'OR %s <%% "courses_course"."title")',
+            (query, query),
+            output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            'ts_rank_cd("courses_course"."search_document", websearch_to_tsquery(\'english\', %s)) '
+            '+ word_similarity(%s, "courses_course"."title")',
+            (query, query),
+            output_field=FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+class SQLiteSearchBackend:
+    """FTS5 with BM25 ranking; prefix matching stands in for typo tolerance."""
+
+    # Column weights for title, description, category, tags
+    WEIGHTS = (10.0, 1.0, 4.0, 4.0)
+
+    def search(self, queryset, query):
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return queryset.none()
+
+        # The match is part of the course query, so the queryset's own filters
+        # (published, category, level) apply to every match, not a top-N of them
+        match = ' '.join('"%s"*' % term for term in terms)
+        matches = RawSQL('SELECT rowid FROM courses_course_fts WHERE courses_course_fts MATCH %s', (match,))
+        # bm25() is lower for better matches
+        rank = RawSQL(
+            'SELECT -bm25(courses_course_fts, %s, %s, %s, %s) FROM courses_course_fts '
+            'WHERE courses_course_fts MATCH %s AND rowid = "courses_course"."id"',
+            (*self.WEIGHTS, match),
+            output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+class BasicSearchBackend:
+    """
+    Unindexed substring search, for databases without a full-text index.
+    Ranked by which fields match, weighted as in SQLiteSearchBackend.
+    """
+
+    def search(self, queryset, query):
+        fields = ('title', 'description', 'category', 'tags')
+        rank = sum(
+            (
+                Case(When(**{f"{field}__icontains": query}, then=Value(weight)), default=Value(0.0))
+                for field, weight in zip(fields, SQLiteSearchBackend.WEIGHTS)
+            ),
+            Value(0.0),
+        )
+        match = Q()
+        for field in fields:
+            match |= Q(**{f"{field}__icontains": query})
+        return queryset.filter(match).annotate(search_rank=rank).order_by('-search_rank', '-id')
+
+
+_sqlite_index_available = None
+
+
+def get_search_backend():
+    global _sqlite_index_available
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if connection.vendor == 'sqlite':
+        if _sqlite_index_available is None:
+            _sqlite_index_available = 'courses_course_fts' in connection.introspection.table_names()
+        if _sqlite_index_available:
+            return SQLiteSearchBackend()
+    return BasicSearchBackend()
+
+
+def search_courses(queryset, query):
+    """
+    Filter a Course queryset to full-text matches for ``query``.
+
+    Matches title, description, category and tags, and orders the results
+    by relevance (annotated as ``search_rank``).
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    return get_search_backend().search(queryset, query)
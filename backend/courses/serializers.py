@@ -1,3 +1,6 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import (
     Course, Test, Question, Choice,
@@ -5,12 +8,82 @@ from .models import (
     Enrollment, Payment, Reward, ChatbotInteraction, CourseView
 )
 from accounts.serializers import UserSerializer
+from .images import srcset
 
-class CourseSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Lets clients trim a serializer with ``?fields=a,b`` and add optional
+    fields listed in ``expandable_fields`` with ``?expand=name``.
+
+    ``optimize_queryset`` then restricts a queryset to the columns and joins
+    the remaining fields actually read. Method fields declare the columns
+    they need in ``field_columns``.
+    """
+    expandable_fields = {}
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        for name in self._query_list(request, 'expand'):
+            if name in self.expandable_fields and name not in self.fields:
+                self.fields[name] = self.expandable_fields[name]()
+
+        requested = self._query_list(request, 'fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+    @staticmethod
+    def _query_list(request, param):
+        value = request.query_params.get(param, '')
+        return [name.strip() for name in value.split(',') if name.strip()]
+
+    def optimize_queryset(self, queryset, extra_columns=()):
+        model = self.Meta.model
+        columns, joins, prefetches = set(extra_columns), [], []
+
+        for name, field in self.fields.items():
+            if field.write_only:
+                continue
+            if name in self.field_columns:
+                columns.update(self.field_columns[name])
+                continue
+            if field.source == '*':
+                continue
+            try:
+                model_field = model._meta.get_field(field.source.split('.')[0])
+            except FieldDoesNotExist:
+                continue
+
+            if model_field.many_to_many or model_field.one_to_many:
+                prefetches.append(Prefetch(
+                    model_field.name,
+                    queryset=model_field.related_model.objects.only('pk')
+                ))
+            elif model_field.is_relation:
+                columns.add(model_field.name)
+                if isinstance(field, serializers.BaseSerializer):
+                    joins.append(model_field.name)
+            else:
+                columns.add(model_field.name)
+
+        queryset = queryset.only('pk', *columns)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        return queryset
+
+class CourseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     instructor = UserSerializer(read_only=True)
     instructor_id = serializers.IntegerField(write_only=True)
     is_enrolled = serializers.SerializerMethodField()
     view_count = serializers.SerializerMethodField()
+    thumbnail_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Course
@@ -20,25 +93,74 @@ class CourseSerializer(serializers.ModelSerializer):
             'duration', 'rating', 'enrolled_students', 'created_at',
             'updated_at', 'is_published', 'tags', 'prerequisites',
             'objectives', 'syllabus', 'views_count', 'is_enrolled',
-            'view_count'
+            'view_count', 'thumbnail_srcset'
         )
         read_only_fields = ('id', 'created_at', 'updated_at', 'views_count')
 
+    field_columns = {
+        'is_enrolled': (),
+        'view_count': (),
+        'thumbnail_srcset': ('thumbnail_variants',),
+    }
+
     def get_is_enrolled(self, obj):
+        enrolled_course_ids = self.context.get('enrolled_course_ids')
+        if enrolled_course_ids is not None:
+            return obj.id in enrolled_course_ids
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.enrolled_students.filter(id=request.user.id).exists()
+            return obj.enrollments.filter(user=request.user).exists()
         return False
 
     def get_view_count(self, obj):
+        # Annotated by CourseViewSet on list and detail requests
+        view_total = getattr(obj, 'view_total', None)
+        if view_total is not None:
+            return view_total
         return obj.views.count()
 
+    def get_thumbnail_srcset(self, obj):
+        return srcset(obj.thumbnail_variants, self.context.get('request'))
+
+class CourseDetailSerializer(CourseSerializer):
+    """
+    Course detail without the view counters, which change far more often than
+    the course itself; ``/courses/<id>/stats/`` serves those uncached.
+    """
+
+    class Meta(CourseSerializer.Meta):
+        fields = tuple(
+            name for name in CourseSerializer.Meta.fields
+            if name not in ('views_count', 'view_count')
+        )
+
+class CourseListSerializer(CourseSerializer):
+    """Compact course representation for catalog grids; ``?expand=instructor`` adds the instructor."""
+    expandable_fields = {
+        'instructor': lambda: UserSerializer(read_only=True),
+    }
+
+    class Meta(CourseSerializer.Meta):
+        fields = (
+            'id', 'title', 'thumbnail', 'thumbnail_srcset', 'price',
+            'category', 'level', 'rating', 'total_students',
+            'views_count', 'is_enrolled'
+        )
+
 class CourseViewSerializer(serializers.ModelSerializer):
     class Meta:
         model = CourseView
         fields = ('id', 'user', 'course', 'viewed_at', 'duration')
         read_only_fields = ('id', 'viewed_at')
 
+class ViewEventSerializer(serializers.Serializer):
+    course_id = serializers.IntegerField()
+    duration = serializers.FloatField(min_value=0, max_value=24 * 60 * 60)  # seconds
+
+class ViewBeaconSerializer(serializers.Serializer):
+    token = serializers.CharField(required=False, write_only=True)
+    events = ViewEventSerializer(many=True, allow_empty=False, max_length=500)
+
 class ChoiceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Choice
@@ -61,7 +183,7 @@ class TestSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'description', 'test_type',
             'max_score', 'passing_score', 'time_limit',
-            'due_date', 'questions'
+            'due_date', 'feedback_mode', 'questions'
         )
         read_only_fields = ('id',)
 
@@ -84,6 +206,7 @@ class QuestionSubmissionSerializer(serializers.ModelSerializer):
 
 class TestSubmissionSerializer(serializers.ModelSerializer):
     question_submissions = QuestionSubmissionSerializer(many=True)
+    will_retry = serializers.SerializerMethodField()
     
     class Meta:
         model = TestSubmission
@@ -91,14 +214,20 @@ class TestSubmissionSerializer(serializers.ModelSerializer):
             'id', 'test', 'score', 'status',
             'submitted_at', 'graded_at',
             'ai_feedback', 'ai_score',
+            'grading_attempts', 'will_retry',
             'question_submissions'
         )
         read_only_fields = (
             'id', 'score', 'status',
             'submitted_at', 'graded_at',
-            'ai_feedback', 'ai_score'
+            'ai_feedback', 'ai_score',
+            'grading_attempts'
         )
 
+    def get_will_retry(self, obj):
+        # A partially graded submission is graded again until it runs out of attempts
+        return obj.status == 'partially_graded' and obj.grading_attempts < settings.GRADING_MAX_ATTEMPTS
+
 class UserRewardSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserReward
@@ -1,51 +1,194 @@
+import time
+from collections import defaultdict
+from concurrent.futures import wait
 from django.conf import settings
-import openai
-from typing import Dict, Any, List
-from .models import Test, Question, TestSubmission, QuestionSubmission, UserReward, Course
+from django.db.models import Sum
+from typing import Dict, Any, List, Optional, Set
+from .models import Test, Question, Choice, TestSubmission, QuestionSubmission, UserReward, PointsTransaction
+from .answer_keys import OBJECTIVE_TYPES, AnswerKeyEntry, get_answer_key
+from .background import submit
+from .grade_cache import grade_cache_key, get_cached_grade, set_cached_grade
+from .sandbox import SandboxError, run_test_cases
+from .points import award_points
+from .feedback import QuestionResult, generate_template_feedback, question_feedback_digest
+from .candidates import candidate_lines, retrieve_candidates
+from .llm import chat_completion
 import json
 
-openai.api_key = settings.OPENAI_API_KEY
+def create_test_submission(test: Test, user, answers: List[Dict[str, Any]]) -> TestSubmission:
+    """
+    Save a submission and all of its answers with a fixed number of queries.
+    
+    Question and choice IDs are validated against the test up front, then
+    the answers and their selected choices are each written with a single
+    bulk insert. Call inside a transaction.
+    
+    Args:
+        test: The test being submitted
+        user: The submitting user
+        answers: Dicts with question_id, answer_text and selected_choice_ids
+        
+    Returns:
+        The new pending submission
+        
+    Raises:
+        ValueError: If an answer refers to a question or choice outside the test
+    """
+    try:
+        answers = [
+            {
+                'question_id': int(answer['question_id']),
+                'answer_text': answer.get('answer_text', ''),
+                'choice_ids': list(dict.fromkeys(int(c) for c in answer.get('selected_choice_ids') or [])),
+            }
+            for answer in answers
+        ]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Each answer needs an integer question_id and selected_choice_ids")
+    
+    question_ids = [answer['question_id'] for answer in answers]
+    if len(set(question_ids)) != len(question_ids):
+        raise ValueError("Each question can only be answered once")
+    
+    unknown = set(question_ids) - set(
+        test.questions.filter(id__in=question_ids).values_list('id', flat=True)
+    )
+    if unknown:
+        raise ValueError(f"Questions not in this test: {sorted(unknown)}")
+    
+    choice_ids = {choice_id for answer in answers for choice_id in answer['choice_ids']}
+    choice_questions = dict(
+        Choice.objects.filter(id__in=choice_ids).values_list('id', 'question_id')
+    ) if choice_ids else {}
+    for answer in answers:
+        for choice_id in answer['choice_ids']:
+            if choice_questions.get(choice_id) != answer['question_id']:
+                raise ValueError(f"Choice {choice_id} does not belong to question {answer['question_id']}")
+    
+    submission = TestSubmission.objects.create(test=test, user=user, status='pending')
+    question_submissions = QuestionSubmission.objects.bulk_create([
+        QuestionSubmission(
+            submission=submission,
+            question_id=answer['question_id'],
+            answer_text=answer['answer_text']
+        )
+        for answer in answers
+    ])
+    
+    SelectedChoice = QuestionSubmission.selected_choices.through
+    SelectedChoice.objects.bulk_create([
+        SelectedChoice(questionsubmission_id=question_submission.id, choice_id=choice_id)
+        for question_submission, answer in zip(question_submissions, answers)
+        for choice_id in answer['choice_ids']
+    ])
+    
+    return submission
 
-def evaluate_test_submission(submission: TestSubmission) -> Dict[str, Any]:
+def evaluate_test_submission(submission: TestSubmission, reuse_feedback: bool = False) -> Dict[str, Any]:
     """
     Evaluate a test submission using AI.
     
+    Choice questions are scored inline against the test's cached answer
+    key (see answer_keys.get_answer_key). Short-answer and programming
+    questions are sent to the AI concurrently on the ``evaluation`` pool
+    (EVALUATION_WORKERS calls at a time). Every evaluator stops at the
+    submission's GRADING_DEADLINE, so pool workers are not held past it.
+    Answers not scored by then, or whose code the sandbox could not run, are
+    left ungraded and the result is marked partial, so the submission is
+    graded again later.
+    
     Args:
         submission: The test submission to evaluate
+        reuse_feedback: Keep the submission's overall feedback if the score
+            and outcome come out the same, rather than writing it again
         
     Returns:
         Dict containing evaluation results
     """
     test = submission.test
-    questions = test.questions.all()
-    
-    total_score = 0
-    max_score = sum(q.points for q in questions)
-    ai_feedback = []
+    answer_key = get_answer_key(test)
+    answers = {
+        question_submission.question_id: question_submission
+        for question_submission in submission.question_submissions.all()
+    }
     
-    for question in questions:
-        question_submission = submission.question_submissions.filter(question=question).first()
+    # Objective answers are graded from the compiled key and the selected choice IDs
+    selected = defaultdict(set)
+    for question_submission_id, choice_id in QuestionSubmission.selected_choices.through.objects.filter(
+        questionsubmission__submission=submission
+    ).values_list('questionsubmission_id', 'choice_id'):
+        selected[question_submission_id].add(choice_id)
+    
+    open_question_ids = [
+        question_id for question_id, entry in answer_key.items()
+        if question_id in answers and entry.question_type not in OBJECTIVE_TYPES
+    ]
+    open_questions = Question.objects.select_related('test').prefetch_related('choices', 'test_cases').in_bulk(open_question_ids) if open_question_ids else {}
+    
+    max_score = sum(entry.points for entry in answer_key.values())
+    results = {}
+    futures = {}
+    deadline_at = time.monotonic() + settings.GRADING_DEADLINE
+    
+    for question_id, entry in answer_key.items():
+        question_submission = answers.get(question_id)
         if not question_submission:
             continue
             
         # Evaluate based on question type
-        if question.question_type == 'multiple_choice':
-            score, feedback = evaluate_multiple_choice(question, question_submission)
-        elif question.question_type == 'true_false':
-            score, feedback = evaluate_true_false(question, question_submission)
-        elif question.question_type == 'short_answer':
-            score, feedback = evaluate_short_answer(question, question_submission)
-        elif question.question_type == 'programming':
-            score, feedback = evaluate_programming(question, question_submission)
+        if entry.question_type == 'multiple_choice':
+            results[question_id] = evaluate_multiple_choice(entry, selected[question_submission.id])
+        elif entry.question_type == 'true_false':
+            results[question_id] = evaluate_true_false(entry, selected[question_submission.id])
+        elif entry.question_type == 'short_answer':
+            futures[question_id] = submit(evaluate_short_answer, open_questions[question_id], question_submission, deadline_at, pool='evaluation')
+        elif entry.question_type == 'programming':
+            futures[question_id] = submit(evaluate_programming, open_questions[question_id], question_submission, deadline_at, pool='evaluation')
         else:
-            score, feedback = 0, "Unsupported question type"
+            results[question_id] = (0, "Unsupported question type")
+    
+    # Ungraded questions and the reason shown for each
+    ungraded = {}
+    # Evaluators give up at the deadline themselves; the grace covers their last reply
+    done, _ = wait(futures.values(), timeout=max(0, deadline_at - time.monotonic()) + DEADLINE_GRACE)
+    for question_id, future in futures.items():
+        if future not in done:
+            future.cancel()
+            ungraded[question_id] = "Grading timed out; this answer has not been scored yet."
+            continue
+        try:
+            results[question_id] = future.result()
+        except GradingTimeout:
+            ungraded[question_id] = "Grading timed out; this answer has not been scored yet."
+        except SandboxError as e:
+            # The sandbox failed, not the student's code: no score rather than a zero
+            print(f"Error running code for question {question_id}: {str(e)}")
+            ungraded[question_id] = "Your code could not be run yet; it will be graded again."
+    
+    total_score = 0
+    question_results = []
+    graded = []
+    # The answer key is in question order, so positions number the questions as students see them
+    for number, (question_id, entry) in enumerate(answer_key.items(), start=1):
+        question_submission = answers.get(question_id)
+        if not question_submission:
+            continue
+        if question_id not in results:
+            question_submission.score = None
+            question_submission.ai_feedback = ungraded[question_id]
+            graded.append(question_submission)
+            question_results.append(QuestionResult(question_id, number, entry.question_type, entry.points, None, ''))
+            continue
             
+        score, feedback = results[question_id]
         question_submission.score = score
         question_submission.ai_feedback = feedback
-        question_submission.save()
+        graded.append(question_submission)
         
         total_score += score
-        ai_feedback.append(f"Question {question.id}: {feedback}")
+        question_results.append(QuestionResult(question_id, number, entry.question_type, entry.points, score, feedback))
+    
+    QuestionSubmission.objects.bulk_update(graded, ['score', 'ai_feedback'])
     
     # Calculate final score
     final_score = int((total_score / max_score) * test.max_score)
@@ -53,51 +196,98 @@ def evaluate_test_submission(submission: TestSubmission) -> Dict[str, Any]:
     # Determine if passed
     passed = final_score >= test.passing_score
     
-    # Generate overall feedback
-    overall_feedback = generate_overall_feedback(
-        test, final_score, passed, ai_feedback
+    # Generate overall feedback, unless a re-grade landed on the same result
+    unchanged = (
+        not ungraded
+        and final_score == submission.score
+        and submission.status == ('graded' if passed else 'failed')
     )
+    if reuse_feedback and unchanged and submission.ai_feedback:
+        overall_feedback = submission.ai_feedback
+    else:
+        overall_feedback = generate_overall_feedback(
+            test, final_score, passed, question_results
+        )
     
     return {
         'score': final_score,
         'passed': passed,
+        'partial': bool(ungraded),
         'feedback': overall_feedback,
         'ai_score': total_score / max_score
     }
 
-def evaluate_multiple_choice(question: Question, submission: QuestionSubmission) -> tuple[int, str]:
-    """Evaluate a multiple choice question."""
-    selected_choices = submission.selected_choices.all()
-    correct_choices = question.choices.filter(is_correct=True)
-    
+def evaluate_multiple_choice(entry: AnswerKeyEntry, selected_ids: Set[int]) -> tuple[int, str]:
+    """Evaluate a multiple choice question against its answer key entry."""
     score = 0
-    if set(selected_choices) == set(correct_choices):
-        score = question.points
+    if selected_ids == entry.correct:
+        score = entry.points
         
-    feedback = f"Selected: {', '.join(c.choice_text for c in selected_choices)}. "
-    feedback += f"Correct: {', '.join(c.choice_text for c in correct_choices)}."
+    feedback = f"Selected: {', '.join(entry.choices[c] for c in sorted(selected_ids) if c in entry.choices)}. "
+    feedback += f"Correct: {', '.join(entry.choices[c] for c in sorted(entry.correct))}."
     
     return score, feedback
 
-def evaluate_true_false(question: Question, submission: QuestionSubmission) -> tuple[int, str]:
-    """Evaluate a true/false question."""
-    correct_answer = question.choices.filter(is_correct=True).first()
-    selected_answer = submission.selected_choices.first()
+def evaluate_true_false(entry: AnswerKeyEntry, selected_ids: Set[int]) -> tuple[int, str]:
+    """Evaluate a true/false question against its answer key entry."""
+    correct_answer = min(entry.correct, default=None)
+    selected_answer = min(selected_ids, default=None)
     
-    score = question.points if selected_answer == correct_answer else 0
+    score = entry.points if selected_answer == correct_answer else 0
     
-    feedback = f"Your answer: {selected_answer.choice_text if selected_answer else 'No answer'}. "
-    feedback += f"Correct answer: {correct_answer.choice_text if correct_answer else 'Not set'}."
+    feedback = f"Your answer: {entry.choices.get(selected_answer, 'No answer')}. "
+    feedback += f"Correct answer: {entry.choices.get(correct_answer, 'Not set')}."
     
     return score, feedback
 
-def evaluate_short_answer(question: Question, submission: QuestionSubmission) -> tuple[int, str]:
-    """Evaluate a short answer question using AI."""
+# Bump when a grading prompt or method changes so grades cached by the old one are not reused
+SHORT_ANSWER_PROMPT_VERSION = 1
+PROGRAMMING_PROMPT_VERSION = 2
+
+# Seconds an evaluator may run past the deadline before it is given up on,
+# e.g. waiting for a sandbox reply (sandbox.REPLY_GRACE)
+DEADLINE_GRACE = 10
+
+class GradingTimeout(Exception):
+    """The submission's grading deadline passed before the answer was scored."""
+
+def _time_left(deadline_at: float) -> float:
+    """Seconds until ``deadline_at``, a time.monotonic() value. Raises GradingTimeout once it has passed."""
+    remaining = deadline_at - time.monotonic()
+    if remaining <= 0:
+        raise GradingTimeout('Grading deadline passed')
+    return remaining
+
+def _correct_choice_text(question: Question) -> str:
+    # Reads the prefetched choices so pool threads don't query the database
+    correct = next((c for c in question.choices.all() if c.is_correct), None)
+    return correct.choice_text if correct else ''
+
+def evaluate_short_answer(
+    question: Question,
+    submission: QuestionSubmission,
+    deadline_at: Optional[float] = None
+) -> tuple[int, str]:
+    """
+    Evaluate a short answer question using AI, reusing the grade of an identical answer.
+    
+    Raises:
+        GradingTimeout: If ``deadline_at`` (a time.monotonic() value, by
+            default GRADING_DEADLINE from now) passes before it is scored
+    """
+    cache_key = grade_cache_key('short_answer', SHORT_ANSWER_PROMPT_VERSION, question, submission.answer_text)
+    cached = get_cached_grade('short_answer', cache_key)
+    if cached is not None:
+        return cached
+    if deadline_at is None:
+        deadline_at = time.monotonic() + settings.GRADING_DEADLINE
+    deadline = _time_left(deadline_at)
+    
     prompt = f"""
     Evaluate this short answer question:
     
     Question: {question.question_text}
-    Correct answer: {question.choices.filter(is_correct=True).first().choice_text}
+    Correct answer: {_correct_choice_text(question)}
     Student's answer: {submission.answer_text}
     
     Provide:
@@ -106,33 +296,92 @@ def evaluate_short_answer(question: Question, submission: QuestionSubmission) ->
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are an educational assessment system."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.3,
-            max_tokens=150
+            max_tokens=150,
+            timeout=settings.GRADING_CALL_TIMEOUT,
+            deadline=deadline
         )
         
         # Parse the response
-        result = response.choices[0].message.content
+        result = response
         # TODO: Parse the score and feedback from the result
         
+        set_cached_grade(cache_key, (question.points, result))
         return question.points, result
         
     except Exception as e:
+        if time.monotonic() >= deadline_at:
+            raise GradingTimeout('Grading deadline passed') from e
         return 0, f"Error evaluating answer: {str(e)}"
 
-def evaluate_programming(question: Question, submission: QuestionSubmission) -> tuple[int, str]:
-    """Evaluate a programming question using AI code review."""
+def evaluate_programming(
+    question: Question,
+    submission: QuestionSubmission,
+    deadline_at: Optional[float] = None
+) -> tuple[int, str]:
+    """
+    Evaluate a programming question.
+    
+    The code is run against the question's test cases in the sandbox and
+    scored by the share of cases passed. If every case passes and the
+    question has ``ai_review`` set, an AI code review is appended to the
+    feedback. Questions without test cases are reviewed by the AI alone.
+    Nothing is started that cannot finish by ``deadline_at`` (a
+    time.monotonic() value, by default GRADING_DEADLINE from now).
+    
+    Raises:
+        SandboxError: If the sandbox could not run the code before the
+            deadline; the answer is left ungraded rather than scored zero
+        GradingTimeout: If the deadline passed during an AI-only review
+    """
+    cache_key = grade_cache_key('programming', PROGRAMMING_PROMPT_VERSION, question, submission.answer_text)
+    cached = get_cached_grade('programming', cache_key)
+    if cached is not None:
+        return cached
+    if deadline_at is None:
+        deadline_at = time.monotonic() + settings.GRADING_DEADLINE
+    
+    test_cases = list(question.test_cases.all())
+    if not test_cases:
+        deadline = _time_left(deadline_at)
+        try:
+            review = review_code(question, submission.answer_text, deadline)
+        except Exception as e:
+            if time.monotonic() >= deadline_at:
+                raise GradingTimeout('Grading deadline passed') from e
+            return 0, f"Error reviewing code: {str(e)}"
+        # TODO: Parse the score and feedback from the result
+        set_cached_grade(cache_key, (question.points, review))
+        return question.points, review
+    
+    score, feedback = run_test_cases(submission.answer_text or '', test_cases, question.points, deadline_at)
+    
+    if score == question.points and question.ai_review:
+        try:
+            feedback += "\n\n" + review_code(question, submission.answer_text, _time_left(deadline_at))
+        except Exception as e:
+            # Keep the test result; don't cache it so the review is retried
+            return score, feedback + f"\n\nCode review unavailable: {str(e)}"
+    
+    set_cached_grade(cache_key, (score, feedback))
+    return score, feedback
+
+def review_code(question: Question, answer_text: str, deadline: Optional[float] = None) -> str:
+    """
+    Review submitted code with AI and return the review text, within
+    ``deadline`` seconds (default GRADING_DEADLINE). Raises if the AI call fails.
+    """
     prompt = f"""
     Review this programming submission:
     
     Question: {question.question_text}
-    Expected output: {question.choices.filter(is_correct=True).first().choice_text}
-    Student's code: {submission.answer_text}
+    Expected output: {_correct_choice_text(question)}
+    Student's code: {answer_text}
     
     Provide:
     1. Code quality score (0-{question.points})
@@ -143,33 +392,36 @@ def evaluate_programming(question: Question, submission: QuestionSubmission) ->
        - Best practices
     """
     
-    try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an expert code reviewer."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=500
-        )
-        
-        # Parse the response
-        result = response.choices[0].message.content
-        # TODO: Parse the score and feedback from the result
-        
-        return question.points, result
-        
-    except Exception as e:
-        return 0, f"Error reviewing code: {str(e)}"
+    response = chat_completion(
+        [
+            {"role": "system", "content": "You are an expert code reviewer."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=500,
+        timeout=settings.GRADING_CALL_TIMEOUT,
+        deadline=deadline or settings.GRADING_DEADLINE
+    )
+    
+    return response
 
 def generate_overall_feedback(
     test: Test,
     score: int,
     passed: bool,
-    question_feedback: List[str]
+    question_results: List[QuestionResult]
 ) -> str:
-    """Generate overall feedback for the test submission."""
+    """
+    Generate overall feedback for the test submission.
+    
+    Tests with ``feedback_mode='template'`` get a summary built locally from
+    the question scores. Otherwise the AI writes it from a digest of the
+    per-question feedback, shortened to fit OVERALL_FEEDBACK_PROMPT_CHARS.
+    """
+    if test.feedback_mode == 'template':
+        return generate_template_feedback(test, score, passed, question_results)
+    
+    question_feedback = question_feedback_digest(question_results, settings.OVERALL_FEEDBACK_PROMPT_CHARS)
     prompt = f"""
     Generate overall feedback for this test submission:
     
@@ -177,7 +429,7 @@ def generate_overall_feedback(
     Score: {score}/{test.max_score}
     Passed: {'Yes' if passed else 'No'}
     Question Feedback:
-    {chr(10).join(question_feedback)}
+    {question_feedback}
     
     Provide:
     1. Overall performance summary
@@ -186,17 +438,18 @@ def generate_overall_feedback(
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are an educational feedback system."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=300
+            max_tokens=300,
+            timeout=settings.GRADING_CALL_TIMEOUT,
+            deadline=settings.GRADING_DEADLINE
         )
         
-        return response.choices[0].message.content
+        return response
         
     except Exception as e:
         return f"Error generating feedback: {str(e)}"
@@ -205,6 +458,11 @@ def award_rewards(submission: TestSubmission) -> List[UserReward]:
     """
     Award rewards based on test performance.
     
+    Safe to call again after the submission is re-graded: its reward rows
+    are replaced, and only the difference from the points already in the
+    ledger for it is recorded, as a ``regrade`` adjustment. Call inside a
+    transaction.
+    
     Args:
         submission: The test submission to award rewards for
         
@@ -216,6 +474,11 @@ def award_rewards(submission: TestSubmission) -> List[UserReward]:
     # Calculate points based on score
     points = int(submission.score * 10)  # 10 points per percentage point
     
+    awarded = PointsTransaction.objects.filter(test_submission=submission).aggregate(
+        total=Sum('points')
+    )['total']
+    UserReward.objects.filter(test_submission=submission).delete()
+    
     # Award points
     rewards.append(UserReward.objects.create(
         user=submission.user,
@@ -223,6 +486,22 @@ def award_rewards(submission: TestSubmission) -> List[UserReward]:
         reward_type='points',
         reward_value=str(points)
     ))
+    if awarded is None:
+        award_points(
+            submission.user,
+            points,
+            course=submission.test.course,
+            test_submission=submission,
+            reason='test'
+        )
+    elif points != awarded:
+        award_points(
+            submission.user,
+            points - awarded,
+            course=submission.test.course,
+            test_submission=submission,
+            reason='regrade'
+        )
     
     # Award badges based on performance
     if submission.score >= 90:
@@ -277,9 +556,8 @@ def get_course_recommendations(user, test_submissions):
         ]
     }
     
-    # Get available courses (excluding completed ones)
-    completed_course_ids = user.enrolled_courses.filter(status='completed').values_list('course_id', flat=True)
-    available_courses = Course.objects.filter(is_published=True).exclude(id__in=completed_course_ids)
+    # Shortlist candidates locally rather than sending the whole catalog
+    candidates = retrieve_candidates(user)
     
     prompt = f"""
     Based on the following user data, recommend suitable courses:
@@ -292,26 +570,20 @@ def get_course_recommendations(user, test_submissions):
     Learning History:
     {json.dumps(performance_data['learning_history'], indent=2)}
     
-    Available Courses:
-    {json.dumps([{
-        'id': course.id,
-        'title': course.title,
-        'level': course.level,
-        'category': course.category,
-        'tags': course.tags
-    } for course in available_courses], indent=2)}
-    
     For each recommended course, provide:
     1. Course ID
     2. Reason for recommendation
     3. Confidence score (0-1)
     4. Suggested difficulty level
+    
+    Candidate Courses (one per line):
     """
+    lines = candidate_lines(candidates, settings.RECOMMENDATION_PROMPT_TOKENS, prompt)
+    prompt += "\n".join(lines)
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are an educational recommendation system."},
                 {"role": "user", "content": prompt}
             ],
@@ -321,7 +593,7 @@ def get_course_recommendations(user, test_submissions):
         
         # Parse the response and create recommendations
         recommendations = []
-        result = response.choices[0].message.content
+        result = response
         
         # TODO: Parse the result into structured recommendations
         # This is a placeholder implementation
@@ -333,7 +605,7 @@ def get_course_recommendations(user, test_submissions):
                 'reason': f"Based on your interests in {', '.join(performance_data['interests'])}",
                 'confidence_score': 0.8
             }
-            for course in available_courses[:5]
+            for course, _ in candidates[:5]
         ]
         
         return recommendations
@@ -384,9 +656,8 @@ def adjust_difficulty(user, course):
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are an educational difficulty adjustment system."},
                 {"role": "user", "content": prompt}
             ],
@@ -395,7 +666,7 @@ def adjust_difficulty(user, course):
         )
         
         # Parse the response
-        result = response.choices[0].message.content
+        result = response
         
         # TODO: Parse the result into structured recommendations
         # This is a placeholder implementation
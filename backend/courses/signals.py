@@ -1,9 +1,19 @@
-from django.db.models.signals import post_save
+import copy
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_init, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.core.mail import send_mail
 from django.conf import settings
-from django.contrib.auth import get_user_model
-from .models import User
+from django.utils import timezone
+from .background import run_in_background
+from .conditional import bump_catalog_version
+from .content_index import schedule_course_update
+from .images import needs_variants, process_course_thumbnail, process_user_avatar
+from .models import (
+    User, Course, PopularCourse, Test, Question, Choice, ProgrammingTestCase, Enrollment, TestSubmission
+)
+from .recommendation_cache import invalidate_user_recommendations
 
 @receiver(post_save, sender=User)
 def send_registration_emails(sender, instance, created, **kwargs):
@@ -65,4 +75,94 @@ def send_registration_emails(sender, instance, created, **kwargs):
                 )
             except Exception as e:
                 # Log the error but don't break the user creation process
-                print(f"Failed to send admin email: {str(e)}") 
\ No newline at end of file
+                print(f"Failed to send admin email: {str(e)}")
+
+@receiver(post_save, sender=Course)
+def sync_popular_course_category(sender, instance, created, **kwargs):
+    # Leaderboard rows carry a copy of the category for per-category rankings
+    if not created:
+        PopularCourse.objects.filter(course=instance).update(category=instance.category)
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_catalog_changed(sender, instance, **kwargs):
+    bump_catalog_version()
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def schedule_content_index_update(sender, instance, **kwargs):
+    course_id = instance.id
+    transaction.on_commit(lambda: schedule_course_update(course_id))
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+@receiver(post_save, sender=TestSubmission)
+def user_recommendation_inputs_changed(sender, instance, **kwargs):
+    # Catalog changes are covered by the catalog version
+    invalidate_user_recommendations(instance.user_id)
+
+@receiver(m2m_changed, sender=Course.enrolled_students.through)
+def enrolled_students_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # enrolled_students.add()/remove() bypass the Enrollment save signals
+    if action not in ('post_add', 'post_remove'):
+        return
+    if reverse:
+        invalidate_user_recommendations(instance.id)
+    elif pk_set:
+        invalidate_user_recommendations(*pk_set)
+
+# User fields that course payloads embed (accounts.serializers.UserSerializer)
+INSTRUCTOR_PAYLOAD_FIELDS = (
+    'username', 'email', 'first_name', 'last_name', 'avatar', 'avatar_variants', 'bio', 'interests'
+)
+
+def instructor_payload(user):
+    # Read from __dict__ so deferred fields are not loaded; files compare by
+    # name. Copied, so in-place edits to JSON fields still differ from the snapshot
+    values = (user.__dict__.get(field) for field in INSTRUCTOR_PAYLOAD_FIELDS)
+    return copy.deepcopy(tuple(getattr(value, 'name', value) for value in values))
+
+@receiver(post_init, sender=User)
+def remember_instructor_payload(sender, instance, **kwargs):
+    instance._instructor_payload = instructor_payload(instance)
+
+@receiver(post_save, sender=User)
+def touch_instructor_courses(sender, instance, created, update_fields=None, **kwargs):
+    # Course payloads embed the instructor, so their validators must move
+    # too, but only when a field they show has changed
+    if update_fields is not None and not update_fields & set(INSTRUCTOR_PAYLOAD_FIELDS):
+        return
+    payload = instructor_payload(instance)
+    changed = payload != getattr(instance, '_instructor_payload', None)
+    instance._instructor_payload = payload
+    if created or not changed:
+        return
+    Course.objects.filter(instructor=instance).update(updated_at=timezone.now())
+
+def bump_test_version(test_filter):
+    Test.objects.filter(**test_filter).update(
+        version=F('version') + 1,
+        updated_at=timezone.now()
+    )
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def question_changed(sender, instance, **kwargs):
+    bump_test_version({'id': instance.test_id})
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+@receiver(post_save, sender=ProgrammingTestCase)
+@receiver(post_delete, sender=ProgrammingTestCase)
+def choice_changed(sender, instance, **kwargs):
+    bump_test_version({'questions__id': instance.question_id})
+
+@receiver(post_save, sender=Course)
+def schedule_thumbnail_variants(sender, instance, **kwargs):
+    if needs_variants(instance.thumbnail, instance.thumbnail_variants):
+        run_in_background(process_course_thumbnail, instance.id)
+
+@receiver(post_save, sender=User)
+def schedule_avatar_variants(sender, instance, **kwargs):
+    if needs_variants(instance.avatar, instance.avatar_variants):
+        run_in_background(process_user_avatar, instance.id)
@@ -0,0 +1,898 @@
+import json
+import threading
+import time
+import unittest
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase, APITransactionTestCase
+from .content_index import build_content_index, get_content_index, update_courses_in_index
+from .grading import grade_submission
+from . import llm
+from .leaderboard import backfill_popularity
+from .models import (
+    Choice, Course, CourseNeighbor, CourseView, PointsBalance, PointsTransaction, ProgrammingTestCase, Question,
+    QuestionSubmission, Test, TestSubmission, User, UserReward
+)
+from .recommender import recommend_courses
+from .sandbox import SandboxError, SandboxPool, get_sandbox_pool, run_code, run_test_cases
+from .search import BasicSearchBackend
+from .services import create_test_submission, evaluate_test_submission
+from .view_buffer import CourseViewBuffer, course_view_buffer, record_view_durations
+
+
+def create_course(instructor, **fields):
+    defaults = {
+        'title': 'Course',
+        'description': 'A course',
+        'price': 10,
+        'thumbnail': 'course_thumbnails/course.png',
+        # Variants already generated, so no image processing is scheduled
+        'thumbnail_variants': {'source': 'course_thumbnails/course.png'},
+        'is_published': True,
+    }
+    defaults.update(fields)
+    return Course.objects.create(instructor=instructor, **defaults)
+
+
+class CourseSearchTests(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+
+    def search(self, query):
+        response = self.client.get(reverse('course-list'), {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [course['id'] for course in response.data['results']]
+
+    def test_new_course_is_searchable(self):
+        course = create_course(self.instructor, title='Practical Python', description='Scripts and automation')
+        create_course(self.instructor, title='Watercolor basics', description='Painting')
+
+        self.assertEqual(self.search('python'), [course.id])
+
+    def test_edited_course_is_reindexed(self):
+        course = create_course(self.instructor, title='Practical Python')
+        course.title = 'Practical Rust'
+        course.save()
+
+        self.assertEqual(self.search('python'), [])
+        self.assertEqual(self.search('rust'), [course.id])
+
+    def test_filters_apply_to_every_match(self):
+        # Stronger matches outside the category must not crowd out the weaker one inside it
+        for i in range(5):
+            create_course(self.instructor, title=f"Python {i}", category='programming')
+        course = create_course(self.instructor, title='Notebooks', description='Python for analysts', category='data')
+
+        response = self.client.get(reverse('course-list'), {'search': 'python', 'category': 'data'})
+        self.assertEqual([result['id'] for result in response.data['results']], [course.id])
+
+    def test_title_matches_rank_first(self):
+        described = create_course(self.instructor, title='Automation', description='Python scripts')
+        titled = create_course(self.instructor, title='Python basics', description='Scripts')
+
+        self.assertEqual(self.search('python'), [titled.id, described.id])
+
+    def test_pages_through_tied_ranks(self):
+        courses = [create_course(self.instructor, title='Python basics') for _ in range(5)]
+
+        ids = []
+        response = self.client.get(reverse('course-list'), {'search': 'python', 'page_size': 2})
+        while True:
+            ids += [course['id'] for course in response.data['results']]
+            if not response.data['next']:
+                break
+            response = self.client.get(response.data['next'])
+        self.assertEqual(ids, [course.id for course in reversed(courses)])
+
+        # And back again from the last page
+        response = self.client.get(response.data['previous'])
+        self.assertEqual([course['id'] for course in response.data['results']], ids[2:4])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get(reverse('course-list'), {'search': 'python', 'cursor': 'cD1ub3Rqc29u'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_basic_backend_searches_tags_and_ranks_by_field(self):
+        tagged = create_course(self.instructor, title='Automation', tags=['python'])
+        described = create_course(self.instructor, title='Scripts', description='Python scripts')
+        titled = create_course(self.instructor, title='Python basics')
+        create_course(self.instructor, title='Watercolor basics')
+
+        results = BasicSearchBackend().search(Course.objects.all(), 'python')
+        self.assertEqual(list(results.values_list('id', flat=True)), [titled.id, tagged.id, described.id])
+
+
+class PopularCoursesTests(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.courses = [create_course(self.instructor, title=f"Course {i}") for i in range(3)]
+        viewers = [
+            User.objects.create_user(username=f"viewer{i}", email=f"viewer{i}@example.com", password='x')
+            for i in range(3)
+        ]
+        # Course 0 viewed by three users, course 1 by one, course 2 by none
+        for viewer in viewers:
+            CourseView.objects.create(user=viewer, course=self.courses[0])
+        CourseView.objects.create(user=viewers[0], course=self.courses[1])
+
+    def popular(self, **params):
+        return self.client.get(reverse('course-popular'), params)
+
+    def test_backfill_seeds_windows_from_course_views(self):
+        backfill_popularity()
+
+        response = self.popular()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([course['id'] for course in response.data], [self.courses[0].id, self.courses[1].id])
+
+    def test_limit_is_clamped(self):
+        backfill_popularity()
+
+        for limit, expected in (('-1', 1), ('0', 1), ('1', 1), ('500', 2)):
+            response = self.popular(limit=limit)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), expected)
+
+    def test_non_integer_limit_is_rejected(self):
+        self.assertEqual(self.popular(limit='ten').status_code, 400)
+
+
+class SimilarCoursesTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.course = create_course(self.instructor, title='Python basics', description='Python scripts')
+        self.others = [
+            create_course(self.instructor, title=f"Python {topic}", description='Python programs')
+            for topic in ('testing', 'packaging', 'web')
+        ]
+        build_content_index()
+
+    def similar(self, **params):
+        return self.client.get(reverse('course-similar', args=[self.course.id]), params)
+
+    def test_limit_is_clamped(self):
+        for limit, expected in (('-1', 1), ('0', 1), ('2', 2), ('500', 3)):
+            response = self.similar(limit=limit)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data), expected)
+
+    def test_non_integer_limit_is_rejected(self):
+        self.assertEqual(self.similar(limit='ten').status_code, 400)
+
+    def test_batched_update_replaces_changed_rows(self):
+        edited, unpublished, _ = self.others
+        edited.title = 'Watercolor'
+        edited.description = 'Painting'
+        edited.save()
+        unpublished.is_published = False
+        unpublished.save()
+        added = create_course(self.instructor, title='Python data', description='Python notebooks')
+
+        update_courses_in_index([edited.id, unpublished.id, added.id])
+
+        index = get_content_index()
+        self.assertNotIn(unpublished.id, index.rows)
+        self.assertEqual(index.matrix.shape[0], len(index.course_ids))
+        similar = [course_id for course_id, _ in index.scores([self.course.id])]
+        self.assertIn(added.id, similar)
+        self.assertNotIn(edited.id, similar)
+
+
+
+class CourseQueryCountTests(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        self.courses = [create_course(self.instructor, title=f"Course {i}") for i in range(10)]
+        for course in self.courses:
+            course.enrolled_students.add(self.student)
+            CourseView.objects.create(user=self.student, course=course)
+        self.course = self.courses[0]
+        # No flusher thread racing the test database; tearDown flushes instead
+        patcher = mock.patch.object(course_view_buffer, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        # Write the detail views recorded by the tests while the test database exists
+        course_view_buffer.flush()
+
+    def assertQueryBudget(self, url, params, anonymous, authenticated):
+        with self.assertNumQueries(anonymous):
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        self.client.force_authenticate(self.student)
+        with self.assertNumQueries(authenticated):
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+
+    def test_list(self):
+        # Courses, plus the caller's enrolled course IDs
+        self.assertQueryBudget(reverse('course-list'), {}, 1, 2)
+
+    def test_list_with_fields(self):
+        # Instructor joined, view counts annotated, enrolled students prefetched
+        params = {'fields': 'id,title,instructor,view_count,is_enrolled,enrolled_students'}
+        self.assertQueryBudget(reverse('course-list'), params, 2, 3)
+
+    def test_list_query_count_does_not_grow_with_page(self):
+        create_course(self.instructor, title='Extra course')
+        self.test_list()
+
+    def test_detail(self):
+        # Course with instructor, plus its enrolled students
+        self.assertQueryBudget(reverse('course-detail', args=[self.course.id]), {}, 2, 3)
+
+    def test_detail_with_fields(self):
+        self.assertQueryBudget(reverse('course-detail', args=[self.course.id]), {'fields': 'id,title'}, 1, 2)
+
+
+class CourseDetailCachingTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.course = create_course(instructor)
+        self.url = reverse('course-detail', args=[self.course.id])
+
+    def tearDown(self):
+        course_view_buffer.flush()
+
+    def test_view_counters_do_not_change_the_etag(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('views_count', response.data)
+        self.assertNotIn('view_count', response.data)
+
+        Course.objects.filter(id=self.course.id).update(views_count=50)
+        CourseView.objects.create(user=self.viewer, course=self.course)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_stats_serves_the_counters(self):
+        Course.objects.filter(id=self.course.id).update(views_count=50)
+        CourseView.objects.create(user=self.viewer, course=self.course)
+
+        response = self.client.get(reverse('course-stats', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'views_count': 50, 'view_count': 1})
+
+
+class TestSubmissionQueryCountTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        self.course = create_course(instructor)
+
+    def create_test(self, questions):
+        test = Test.objects.create(course=self.course, title='Quiz', description='Quiz', test_type='quiz')
+        answers = []
+        for i in range(questions):
+            if i % 2:
+                question = Question.objects.create(test=test, question_type='short_answer', question_text=f"Question {i}")
+                answers.append({'question_id': question.id, 'answer_text': 'An answer'})
+            else:
+                question = Question.objects.create(test=test, question_type='multiple_choice', question_text=f"Question {i}")
+                choices = [
+                    Choice.objects.create(question=question, choice_text=text, is_correct=text == 'Yes')
+                    for text in ('Yes', 'No', 'Maybe')
+                ]
+                answers.append({'question_id': question.id, 'selected_choice_ids': [choices[0].id, choices[2].id]})
+        return test, answers
+
+    def submission_queries(self, questions):
+        test, answers = self.create_test(questions)
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                submission = create_test_submission(test, self.student, answers)
+        self.assertEqual(submission.question_submissions.count(), questions)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_questions(self):
+        self.assertEqual(self.submission_queries(2), self.submission_queries(20))
+
+    def test_query_budget(self):
+        test, answers = self.create_test(10)
+        # Savepoint, question and choice validation, then one insert each for
+        # the submission, its answers and their selected choices
+        with self.assertNumQueries(7):
+            with transaction.atomic():
+                create_test_submission(test, self.student, answers)
+
+    def test_submit_endpoint_query_count_does_not_grow_with_questions(self):
+        self.client.force_authenticate(self.student)
+
+        def submit_queries(questions):
+            test, answers = self.create_test(questions)
+            url = reverse('course-test-submit', args=[self.course.id, test.id])
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, {'test_id': test.id, 'question_submissions': answers}, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(len(response.data['submission']['question_submissions']), questions)
+            return len(queries)
+
+        self.assertEqual(submit_queries(2), submit_queries(20))
+
+
+def evaluation(score, partial=False):
+    return {'score': score, 'partial': partial, 'passed': score >= 70, 'feedback': 'Feedback', 'ai_score': score / 100}
+
+
+@override_settings(GRADING_MAX_ATTEMPTS=2)
+class GradingRetryTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        test = Test.objects.create(course=create_course(instructor), title='Quiz', description='Quiz', test_type='quiz')
+        self.submission = TestSubmission.objects.create(test=test, user=self.student)
+
+    def grade(self, result):
+        with mock.patch('courses.grading.evaluate_test_submission', return_value=result):
+            return grade_submission(self.submission.id)
+
+    def test_partially_graded_submission_is_retried_without_double_rewards(self):
+        self.assertEqual(self.grade(evaluation(50, partial=True)).status, 'partially_graded')
+        submission = self.grade(evaluation(95))
+
+        self.assertEqual(submission.status, 'graded')
+        self.assertEqual(submission.grading_attempts, 2)
+        self.assertEqual(PointsBalance.objects.get(user=self.student).points, 950)
+        self.assertEqual(
+            list(PointsTransaction.objects.filter(test_submission=submission).order_by('id').values_list('reason', 'points')),
+            [('test', 500), ('regrade', 450)]
+        )
+        self.assertEqual(
+            sorted(UserReward.objects.filter(test_submission=submission).values_list('reward_type', 'reward_value')),
+            [('badge', 'Excellent Performance'), ('certificate', f"/certificates/{submission.id}.pdf"), ('points', '950')]
+        )
+
+    def test_retries_stop_after_max_attempts(self):
+        self.grade(evaluation(50, partial=True))
+        self.grade(evaluation(50, partial=True))
+
+        self.assertIsNone(self.grade(evaluation(95)))
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'partially_graded')
+        self.assertEqual(self.submission.grading_attempts, 2)
+
+    def test_failed_retry_stays_partially_graded(self):
+        self.grade(evaluation(50, partial=True))
+        with mock.patch('courses.grading.evaluate_test_submission', side_effect=RuntimeError('down')):
+            with self.assertRaises(RuntimeError):
+                grade_submission(self.submission.id)
+
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'partially_graded')
+
+
+class RegradeRewardsTests(APITransactionTestCase):
+    # The command grades on a thread pool, so the data must be committed
+
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        self.test = Test.objects.create(course=create_course(instructor), title='Quiz', description='Quiz', test_type='quiz')
+        self.submission = TestSubmission.objects.create(test=self.test, user=self.student)
+        with mock.patch('courses.grading.evaluate_test_submission', return_value=evaluation(95)):
+            grade_submission(self.submission.id)
+
+    def regrade(self, result):
+        with mock.patch('courses.management.commands.regrade_submissions.evaluate_test_submission', return_value=result):
+            call_command('regrade_submissions', test=self.test.id, stdout=StringIO())
+
+    def test_changed_score_adjusts_rewards_and_points(self):
+        self.regrade(evaluation(60))
+
+        self.assertEqual(PointsBalance.objects.get(user=self.student).points, 600)
+        self.assertEqual(
+            list(PointsTransaction.objects.filter(test_submission=self.submission).order_by('id').values_list('reason', 'points')),
+            [('test', 950), ('regrade', -350)]
+        )
+        self.assertEqual(
+            list(UserReward.objects.filter(test_submission=self.submission).values_list('reward_type', 'reward_value')),
+            [('points', '600')]
+        )
+
+    def test_unchanged_score_leaves_rewards_alone(self):
+        rewards = set(UserReward.objects.filter(test_submission=self.submission).values_list('id', flat=True))
+        self.regrade(evaluation(95))
+
+        self.assertEqual(set(UserReward.objects.filter(test_submission=self.submission).values_list('id', flat=True)), rewards)
+        self.assertEqual(PointsTransaction.objects.filter(test_submission=self.submission).count(), 1)
+
+    @override_settings(GRADING_MAX_ATTEMPTS=2)
+    def test_submissions_queued_for_retry_are_skipped(self):
+        TestSubmission.objects.filter(id=self.submission.id).update(status='partially_graded', grading_attempts=1)
+        with mock.patch('courses.management.commands.regrade_submissions.evaluate_test_submission') as evaluate:
+            call_command('regrade_submissions', test=self.test.id, stdout=StringIO())
+        evaluate.assert_not_called()
+
+        # Out of attempts, it is no longer the grader's to retry
+        TestSubmission.objects.filter(id=self.submission.id).update(grading_attempts=2)
+        self.regrade(evaluation(95))
+        self.submission.refresh_from_db()
+        self.assertEqual(self.submission.status, 'graded')
+
+
+class ViewDurationInvalidationTests(APITransactionTestCase):
+    # No enclosing test transaction, so on_commit callbacks run as in a request
+
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.course = create_course(instructor)
+
+    def test_first_view_invalidates_after_the_write_commits(self):
+        def invalidate(*user_ids):
+            self.assertTrue(CourseView.objects.filter(user=self.viewer, course=self.course).exists())
+            invalidated.extend(user_ids)
+
+        invalidated = []
+        with mock.patch('courses.view_buffer.invalidate_user_recommendations', side_effect=invalidate):
+            record_view_durations(self.viewer.id, {self.course.id: timedelta(minutes=5)})
+
+        self.assertEqual(invalidated, [self.viewer.id])
+
+    def test_repeat_view_does_not_invalidate(self):
+        CourseView.objects.create(user=self.viewer, course=self.course)
+        with mock.patch('courses.view_buffer.invalidate_user_recommendations') as invalidate:
+            record_view_durations(self.viewer.id, {self.course.id: timedelta(minutes=5)})
+
+        invalidate.assert_not_called()
+
+
+class PointsLeaderboardTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='student', email='student@example.com', password='x')
+        self.client.force_authenticate(self.user)
+
+    def test_non_integer_limit_is_rejected(self):
+        response = self.client.get(reverse('points-leaderboard-list'), {'limit': 'ten'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BeaconAuthenticationTests(APITestCase):
+    def test_non_string_token_is_rejected(self):
+        for token in (123, ['token'], {'token': 'x'}):
+            response = self.client.post(reverse('course-beacon'), {'token': token, 'views': []}, format='json')
+            self.assertEqual(response.status_code, 401)
+
+
+class RecommendCoursesTests(APITestCase):
+    def test_unpublished_neighbors_do_not_take_up_the_limit(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        viewed = create_course(instructor, title='Viewed')
+        CourseView.objects.create(user=student, course=viewed)
+        # The closest neighbors are all unpublished
+        for i in range(4):
+            hidden = create_course(instructor, title=f"Draft {i}", is_published=False)
+            CourseNeighbor.objects.create(course=viewed, neighbor=hidden, score=0.9)
+        published = [create_course(instructor, title=f"Course {i}") for i in range(2)]
+        for i, course in enumerate(published):
+            CourseNeighbor.objects.create(course=viewed, neighbor=course, score=0.5 - i * 0.1)
+
+        recommended = recommend_courses(student, limit=2)
+
+        self.assertEqual([course.id for course, _, _ in recommended], [course.id for course in published])
+        self.assertEqual(recommended[0][1], 1.0)
+
+
+class InstructorChangeTests(APITestCase):
+    def setUp(self):
+        self.instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        self.course = create_course(self.instructor)
+        self.updated_at = self.course.updated_at
+
+    def course_touched(self):
+        self.course.refresh_from_db()
+        return self.course.updated_at != self.updated_at
+
+    def test_embedded_field_change_touches_courses(self):
+        instructor = User.objects.get(id=self.instructor.id)
+        instructor.first_name = 'Ada'
+        instructor.save()
+
+        self.assertTrue(self.course_touched())
+
+    def test_in_place_json_change_touches_courses(self):
+        instructor = User.objects.get(id=self.instructor.id)
+        instructor.interests.append('python')
+        instructor.save()
+
+        self.assertTrue(self.course_touched())
+
+    def test_other_changes_do_not_query_courses(self):
+        instructor = User.objects.get(id=self.instructor.id)
+        instructor.set_password('y')
+        # Only the UPDATE of the user row
+        with self.assertNumQueries(1):
+            instructor.save()
+        with self.assertNumQueries(1):
+            instructor.save(update_fields=['last_login'])
+
+        self.assertFalse(self.course_touched())
+
+
+def sandbox_unavailable():
+    # The sandbox needs user namespaces and a SANDBOX_USER able to run SANDBOX_PYTHON
+    try:
+        run_code('print(1)')
+    except SandboxError as e:
+        return str(e)
+    return None
+
+
+def test_cases(*cases):
+    return [
+        ProgrammingTestCase(input=stdin, expected_output=expected, is_hidden=False, order=i)
+        for i, (stdin, expected) in enumerate(cases)
+    ]
+
+
+class SandboxTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        reason = sandbox_unavailable()
+        if reason:
+            raise unittest.SkipTest(f"Sandbox unavailable here: {reason}")
+        super().setUpClass()
+
+    def test_passing_program(self):
+        score, feedback = run_test_cases('print(int(input()) * 2)', test_cases(('2', '4'), ('5', '10')), 10)
+
+        self.assertEqual(score, 10)
+        self.assertEqual(feedback, 'Passed 2/2 test cases.')
+
+    def test_failing_program(self):
+        score, feedback = run_test_cases('print(int(input()) + 2)', test_cases(('2', '4'), ('5', '10')), 10)
+
+        self.assertEqual(score, 5)
+        self.assertIn('Test 2: wrong output.', feedback)
+
+    @override_settings(SANDBOX_CPU_SECONDS=1, SANDBOX_WALL_SECONDS=2)
+    def test_timeout(self):
+        score, feedback = run_test_cases('while True:\n    pass', test_cases(('', '')), 10)
+
+        self.assertEqual(score, 0)
+        self.assertIn('Test 1: timeout.', feedback)
+
+    def test_dead_idle_workers_are_replaced(self):
+        pool = get_sandbox_pool()
+        for worker in list(pool.idle.queue):
+            worker.process.kill()
+            worker.process.wait()
+
+        for _ in range(pool.idle.qsize()):
+            self.assertEqual(run_test_cases('print(1)', test_cases(('', '1')), 10)[0], 10)
+
+    def test_worker_death_during_a_job_raises(self):
+        pool = get_sandbox_pool()
+        processes = [worker.process for worker in pool.idle.queue]
+        killer = threading.Timer(0.5, lambda: [process.kill() for process in processes])
+        killer.start()
+        try:
+            with self.assertRaises(SandboxError):
+                run_test_cases('import time\ntime.sleep(2)', test_cases(('', '')), 10)
+        finally:
+            killer.join()
+        # The dead workers are restarted, so the pool still works
+        self.assertEqual(run_test_cases('print(1)', test_cases(('', '1')), 10)[0], 10)
+
+
+class ProgrammingGradingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        test = Test.objects.create(
+            course=create_course(instructor), title='Exercise', description='Exercise',
+            test_type='programming', feedback_mode='template'
+        )
+        question = Question.objects.create(test=test, question_type='programming', question_text='Double it', points=10)
+        ProgrammingTestCase.objects.create(question=question, input='2', expected_output='4')
+        self.submission = TestSubmission.objects.create(test=test, user=student)
+        self.answer = QuestionSubmission.objects.create(
+            submission=self.submission, question=question, answer_text='print(int(input()) * 2)'
+        )
+
+    def test_sandbox_failure_leaves_answer_ungraded(self):
+        with mock.patch('courses.services.run_test_cases', side_effect=SandboxError('worker exited')):
+            result = evaluate_test_submission(self.submission)
+
+        self.assertTrue(result['partial'])
+        self.answer.refresh_from_db()
+        self.assertIsNone(self.answer.score)
+
+    def test_sandbox_result_is_scored(self):
+        with mock.patch('courses.services.run_test_cases', return_value=(10, 'Passed 1/1 test cases.')):
+            result = evaluate_test_submission(self.submission)
+
+        self.assertFalse(result['partial'])
+        self.assertEqual(result['score'], 100)
+
+
+class SandboxDeadlineTests(SimpleTestCase):
+    def test_job_that_cannot_finish_in_time_is_not_started(self):
+        pool = SandboxPool(0)
+        with self.assertRaises(SandboxError):
+            pool.run({'wall_seconds': 5}, deadline_at=time.monotonic() + 1)
+
+    def test_waits_for_a_worker_only_until_the_deadline(self):
+        pool = SandboxPool(0)
+        started = time.monotonic()
+        with self.assertRaises(SandboxError):
+            pool.run({'wall_seconds': 1}, deadline_at=started + 1.5)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class GradingDeadlineTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        test = Test.objects.create(
+            course=create_course(instructor), title='Quiz', description='Quiz',
+            test_type='quiz', feedback_mode='template'
+        )
+        question = Question.objects.create(test=test, question_type='short_answer', question_text='Why?', points=10)
+        self.submission = TestSubmission.objects.create(test=test, user=student)
+        self.answer = QuestionSubmission.objects.create(
+            submission=self.submission, question=question, answer_text='Because'
+        )
+
+    @override_settings(GRADING_DEADLINE=0)
+    def test_evaluator_stops_at_the_deadline(self):
+        with mock.patch('courses.services.chat_completion') as completion:
+            result = evaluate_test_submission(TestSubmission.objects.get(id=self.submission.id))
+
+        completion.assert_not_called()
+        self.assertTrue(result['partial'])
+        self.answer.refresh_from_db()
+        self.assertIsNone(self.answer.score)
+        self.assertIn('timed out', self.answer.ai_feedback)
+
+    def test_call_gets_the_time_left(self):
+        with mock.patch('courses.services.chat_completion', return_value='Good') as completion:
+            evaluate_test_submission(TestSubmission.objects.get(id=self.submission.id))
+
+        # Measured from the start of the submission, not of the call
+        self.assertLess(completion.call_args.kwargs['deadline'], settings.GRADING_DEADLINE)
+
+
+class StopFlusher(Exception):
+    pass
+
+
+class ViewFlusherConnectionTests(SimpleTestCase):
+    def test_stale_connections_are_dropped_around_each_flush(self):
+        buffer = CourseViewBuffer(flush_interval=1)
+        # One pass of the loop, then stop the thread's loop
+        buffer._wakeup = mock.Mock(wait=mock.Mock(side_effect=[True, StopFlusher]))
+        with mock.patch('courses.view_buffer.close_old_connections') as close_old_connections, \
+                mock.patch.object(buffer, 'flush', side_effect=RuntimeError('server closed the connection')), \
+                mock.patch('courses.view_buffer.expire_windows_if_due'):
+            with self.assertRaises(StopFlusher):
+                buffer._run()
+
+        # Before the flush, and again after it failed
+        self.assertEqual(close_old_connections.call_count, 2)
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """Chat completions endpoint replaying the server's queued (status, delay) replies."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(body)
+        status, delay = self.server.replies.pop(0) if self.server.replies else (200, 0)
+        time.sleep(delay)
+        if status == 200:
+            payload = {
+                'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+                'choices': [{
+                    'index': 0, 'finish_reason': 'stop',
+                    'message': {'role': 'assistant', 'content': f"reply {len(self.server.requests)}"},
+                }],
+            }
+        else:
+            payload = {'error': {'message': f"status {status}", 'type': 'test'}}
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up (timeout)
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class LLMGatewayTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAI)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.replies = []
+        overrides = override_settings(
+            OPENAI_API_KEY='test-key',
+            OPENAI_BASE_URL=f"http://127.0.0.1:{self.server.server_port}/v1",
+            LLM_MAX_RETRIES=2,
+            LLM_BACKOFF_BASE=0.01,
+            LLM_BACKOFF_CAP=0.02,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # A fresh client, breaker and budget per test
+        for name, value in (
+            ('_client', None),
+            ('breaker', llm.CircuitBreaker(threshold=5, reset_timeout=60)),
+            ('retry_budget', llm.RetryBudget(ratio=0.2, max_tokens=10)),
+        ):
+            patcher = mock.patch.object(llm, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def chat(self, **params):
+        return llm.chat_completion([{'role': 'user', 'content': 'Hello'}], **params)
+
+    def test_reply_text_is_returned(self):
+        self.assertEqual(self.chat(), 'reply 1')
+        self.assertEqual(self.server.requests[0]['messages'], [{'role': 'user', 'content': 'Hello'}])
+
+    def test_server_errors_are_retried(self):
+        self.server.replies = [(500, 0), (503, 0)]
+
+        self.assertEqual(self.chat(), 'reply 3')
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.replies = [(500, 0)] * 3
+
+        with self.assertRaises(llm.LLMUnavailable):
+            self.chat()
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_client_errors_are_not_retried_or_counted(self):
+        self.server.replies = [(400, 0)]
+
+        with self.assertRaises(llm.LLMError) as raised:
+            self.chat()
+        self.assertNotIsInstance(raised.exception, llm.LLMUnavailable)
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertEqual(llm.breaker.state, 'closed')
+
+    def test_retry_budget_caps_retries(self):
+        llm.retry_budget = llm.RetryBudget(ratio=0, max_tokens=1)
+        self.server.replies = [(500, 0)] * 3
+
+        # One retry saved up, so the first call fails twice and the second once
+        with self.assertRaisesMessage(llm.LLMUnavailable, 'retry budget exhausted'):
+            self.chat()
+        self.assertEqual(len(self.server.requests), 2)
+        with self.assertRaisesMessage(llm.LLMUnavailable, 'retry budget exhausted'):
+            self.chat()
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_deadline_bounds_the_whole_call(self):
+        self.server.replies = [(200, 2)] * 3
+
+        started = time.monotonic()
+        with self.assertRaises(llm.LLMUnavailable):
+            self.chat(timeout=5, deadline=0.5)
+        self.assertLess(time.monotonic() - started, 1.5)
+
+    def test_breaker_opens_then_half_opens(self):
+        llm.breaker = llm.CircuitBreaker(threshold=2, reset_timeout=60)
+        with override_settings(LLM_MAX_RETRIES=0):
+            self.server.replies = [(500, 0)] * 2
+            for _ in range(2):
+                with self.assertRaises(llm.LLMUnavailable):
+                    self.chat()
+        self.assertEqual(llm.breaker.state, 'open')
+
+        # Open: refused without calling the server
+        with self.assertRaisesMessage(llm.LLMUnavailable, 'circuit breaker is open'):
+            self.chat()
+        self.assertEqual(len(self.server.requests), 2)
+
+        # After the reset timeout one trial call goes through and closes it
+        llm.breaker.opened_at -= llm.breaker.reset_timeout
+        self.assertEqual(llm.breaker.state, 'half-open')
+        self.assertEqual(self.chat(), 'reply 3')
+        self.assertEqual(llm.breaker.state, 'closed')
+
+    def test_failed_trial_reopens_the_breaker(self):
+        llm.breaker = llm.CircuitBreaker(threshold=2, reset_timeout=60)
+        llm.breaker.record_failure()
+        llm.breaker.record_failure()
+        llm.breaker.opened_at -= llm.breaker.reset_timeout
+        self.server.replies = [(500, 0)]
+
+        with override_settings(LLM_MAX_RETRIES=0):
+            with self.assertRaises(llm.LLMUnavailable):
+                self.chat()
+        self.assertEqual(llm.breaker.state, 'open')
+
+
+class TemplateFeedbackTests(APITestCase):
+    def test_missed_questions_are_numbered_by_position(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        course = create_course(instructor)
+        # Another test's questions first, so IDs and positions differ
+        other = Test.objects.create(course=course, title='Other', description='Other', test_type='quiz')
+        for i in range(5):
+            Question.objects.create(test=other, question_type='true_false', question_text=f"Other {i}")
+
+        test = Test.objects.create(
+            course=course, title='Quiz', description='Quiz', test_type='quiz', feedback_mode='template'
+        )
+        submission = TestSubmission.objects.create(test=test, user=student)
+        for i in range(3):
+            question = Question.objects.create(test=test, question_type='true_false', question_text=f"Question {i}")
+            right = Choice.objects.create(question=question, choice_text='True', is_correct=True)
+            wrong = Choice.objects.create(question=question, choice_text='False')
+            answer = QuestionSubmission.objects.create(submission=submission, question=question)
+            # Only the second question is answered correctly
+            answer.selected_choices.add(right if i == 1 else wrong)
+
+        feedback = evaluate_test_submission(submission)['feedback']
+
+        self.assertIn('Review questions: 1, 3.', feedback)
+
+
+class RegradeFeedbackTests(APITestCase):
+    def setUp(self):
+        instructor = User.objects.create_user(username='instructor', email='instructor@example.com', password='x')
+        student = User.objects.create_user(username='student', email='student@example.com', password='x')
+        test = Test.objects.create(course=create_course(instructor), title='Quiz', description='Quiz', test_type='quiz')
+        self.submission = TestSubmission.objects.create(
+            test=test, user=student, status='graded', score=100, ai_feedback='Earlier feedback'
+        )
+        question = Question.objects.create(test=test, question_type='true_false', question_text='Question')
+        self.right = Choice.objects.create(question=question, choice_text='True', is_correct=True)
+        self.wrong = Choice.objects.create(question=question, choice_text='False')
+        self.answer = QuestionSubmission.objects.create(submission=self.submission, question=question)
+
+    def regrade(self):
+        with mock.patch('courses.services.chat_completion', return_value='New feedback') as completion:
+            # Reloaded, as the command does, so the test's version reflects its questions
+            result = evaluate_test_submission(TestSubmission.objects.get(id=self.submission.id), reuse_feedback=True)
+        return result, completion
+
+    def test_unchanged_result_keeps_feedback(self):
+        self.answer.selected_choices.add(self.right)
+
+        result, completion = self.regrade()
+        completion.assert_not_called()
+        self.assertEqual(result['feedback'], 'Earlier feedback')
+
+    def test_changed_result_rewrites_feedback(self):
+        self.answer.selected_choices.add(self.wrong)
+
+        result, completion = self.regrade()
+        completion.assert_called_once()
+        self.assertEqual(result['score'], 0)
@@ -2,7 +2,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     CourseViewSet, TestViewSet, QuestionViewSet,
-    ChoiceViewSet, UserRewardViewSet
+    ChoiceViewSet, UserRewardViewSet, TestSubmissionViewSet,
+    PointsLeaderboardViewSet
 )
 
 router = DefaultRouter()
@@ -10,6 +11,8 @@ router.register(r'courses', CourseViewSet)
 router.register(r'courses/(?P<course_pk>\d+)/tests', TestViewSet, basename='course-test')
 router.register(r'tests/(?P<test_pk>\d+)/questions', QuestionViewSet, basename='test-question')
 router.register(r'questions/(?P<question_pk>\d+)/choices', ChoiceViewSet, basename='question-choice')
+router.register(r'submissions', TestSubmissionViewSet, basename='test-submission')
+router.register(r'leaderboard', PointsLeaderboardViewSet, basename='points-leaderboard')
 router.register(r'rewards', UserRewardViewSet, basename='user-reward')
 
 urlpatterns = [
@@ -0,0 +1,205 @@
+import atexit
+import os
+import threading
+from collections import Counter, defaultdict
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from .leaderboard import expire_windows_if_due, record_views
+from .models import Course, CourseView
+from .recommendation_cache import invalidate_user_recommendations
+
+
+class CourseViewBuffer:
+    """
+    Write-behind buffer for course detail views.
+
+    Views are counted in process memory and applied to the database by a
+    background flusher thread every ``COURSE_VIEW_FLUSH_INTERVAL`` seconds,
+    so recording a view never waits on a database write. The same thread
+    keeps the rolling popular-course windows up to date.
+
+    Loss bound: counts live only in memory until they are flushed. A worker
+    that is killed without running its exit hooks loses at most
+    ``COURSE_VIEW_BUFFER_MAX_PENDING`` views. Once that many views are
+    pending, further views are dropped (and counted in ``dropped``) until
+    the flusher catches up, so the bound holds even if the database stalls.
+    """
+
+    def __init__(self, flush_interval=None, max_pending=None):
+        self.flush_interval = flush_interval or settings.COURSE_VIEW_FLUSH_INTERVAL
+        self.max_pending = max_pending or settings.COURSE_VIEW_BUFFER_MAX_PENDING
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._counts = Counter()
+        self._viewers = set()
+        self._pending = 0
+        self._flusher_pid = None
+
+    def record(self, course_id, user_id=None):
+        """Buffer a single view of ``course_id``. Never touches the database."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._counts[course_id] += 1
+            if user_id is not None:
+                self._viewers.add((user_id, course_id))
+            self._pending += 1
+            wake = self._pending >= self.max_pending // 2
+
+        self._ensure_flusher()
+        if wake:
+            self._wakeup.set()
+
+    def flush(self):
+        """Apply all buffered views to the database in bulk."""
+        with self._flush_lock:
+            with self._lock:
+                counts, viewers = self._counts, self._viewers
+                self._counts, self._viewers = Counter(), set()
+                self._pending = 0
+
+            if not counts:
+                return
+
+            try:
+                apply_course_views(counts, viewers)
+            except Exception:
+                self._restore(counts, viewers)
+                raise
+
+    def _restore(self, counts, viewers):
+        # Put a failed batch back, without letting it grow past the bound.
+        with self._lock:
+            for course_id, views in counts.items():
+                room = self.max_pending - self._pending
+                if room <= 0:
+                    self.dropped += views
+                    continue
+                kept = min(views, room)
+                self._counts[course_id] += kept
+                self._pending += kept
+                self.dropped += views - kept
+            self._viewers |= viewers
+
+    def _ensure_flusher(self):
+        # Started lazily (and again after a fork) so each worker process
+        # owns exactly one flusher thread.
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            self._flusher_pid = pid
+            thread = threading.Thread(target=self._run, name='course-view-flusher', daemon=True)
+            thread.start()
+            atexit.register(self._flush_quietly)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            # This thread lives as long as the process, so drop a connection
+            # that has gone stale (idle timeout, database restart) before using it
+            close_old_connections()
+            self._flush_quietly()
+            try:
+                expire_windows_if_due()
+            except Exception as e:
+                print(f"Error expiring popular course windows: {str(e)}")
+                close_old_connections()
+
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error flushing course views: {str(e)}")
+            # A broken connection is replaced before the next flush
+            close_old_connections()
+
+
+def _new_viewers(pairs):
+    # Users viewing a course for the first time; call before writing the views
+    user_ids = {user_id for user_id, _ in pairs}
+    existing = set(CourseView.objects.filter(
+        user_id__in=user_ids,
+        course_id__in={course_id for _, course_id in pairs}
+    ).values_list('user_id', 'course_id'))
+    return {user_id for user_id, course_id in pairs if (user_id, course_id) not in existing}
+
+
+def _invalidate_on_commit(user_ids):
+    # Only a first view of a course changes a user's recommendations
+    if user_ids:
+        transaction.on_commit(lambda: invalidate_user_recommendations(*user_ids))
+
+
+def apply_course_views(counts, viewers):
+    """
+    Apply a batch of buffered views.
+
+    Args:
+        counts: Mapping of course ID to number of new views
+        viewers: Set of (user_id, course_id) pairs to record as CourseView rows
+    """
+    # Courses that received the same number of views share one UPDATE.
+    by_increment = defaultdict(list)
+    for course_id, views in counts.items():
+        by_increment[views].append(course_id)
+
+    with transaction.atomic():
+        for views, course_ids in by_increment.items():
+            Course.objects.filter(id__in=course_ids).update(
+                views_count=F('views_count') + views
+            )
+
+        if viewers:
+            new_viewers = _new_viewers(viewers)
+            CourseView.objects.bulk_create(
+                [CourseView(user_id=user_id, course_id=course_id) for user_id, course_id in viewers],
+                update_conflicts=True,
+                unique_fields=['user', 'course'],
+                update_fields=['viewed_at'],
+            )
+            _invalidate_on_commit(new_viewers)
+
+        record_views(counts)
+
+
+def record_view_durations(user_id, durations):
+    """
+    Store the latest viewing duration for several courses in one upsert.
+
+    Args:
+        user_id: The viewing user
+        durations: Mapping of course ID to timedelta. If every duration is
+            None, existing durations are left as they are.
+
+    Returns:
+        The upserted CourseView objects
+    """
+    if not durations:
+        return []
+    update_fields = ['viewed_at']
+    if any(duration is not None for duration in durations.values()):
+        update_fields.append('duration')
+    with transaction.atomic():
+        new_viewers = _new_viewers({(user_id, course_id) for course_id in durations})
+        views = CourseView.objects.bulk_create(
+            [
+                CourseView(user_id=user_id, course_id=course_id, duration=duration)
+                for course_id, duration in durations.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'course'],
+            update_fields=update_fields,
+        )
+        _invalidate_on_commit(new_viewers)
+    return views
+
+
+course_view_buffer = CourseViewBuffer()
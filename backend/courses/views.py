@@ -1,21 +1,37 @@
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.parsers import JSONParser
+from django.db import transaction
 from django.db.models import Count
-from django.utils import timezone
+from django.urls import reverse
 from datetime import timedelta
-from django.shortcuts import get_object_or_404
+from django.http import HttpResponse
 from .models import (
-    Course, CourseView, Test, Question, Choice,
-    TestSubmission, QuestionSubmission, UserReward
+    Course, CourseView, Enrollment, Test, Question, Choice,
+    TestSubmission, UserReward
 )
 from .serializers import (
-    CourseSerializer, CourseViewSerializer, TestSerializer,
+    CourseSerializer, CourseDetailSerializer, CourseListSerializer, CourseViewSerializer, TestSerializer,
     QuestionSerializer, ChoiceSerializer, TestSubmissionSerializer,
-    UserRewardSerializer, CreateTestSubmissionSerializer
+    UserRewardSerializer, CreateTestSubmissionSerializer, ViewBeaconSerializer
 )
-from accounts.services import get_course_recommendations
-from .services import evaluate_test_submission, award_rewards
+from .services import create_test_submission
+from .grading import enqueue_grading
+from .view_buffer import course_view_buffer, record_view_durations
+from .authentication import BeaconJWTAuthentication
+from .parsers import BeaconJSONParser
+from .leaderboard import DEFAULT_WINDOW, WINDOWS, top_courses
+from .search import search_courses
+from .conditional import catalog_version, not_modified, with_validators
+from .facets import course_facets
+from .payloads import test_payload
+from .content_index import similar_courses
+from .recommendation_cache import cached_course_recommendations
+from .points import ALL_TIME, WINDOWS as POINTS_WINDOWS, points_leaderboard
+
+# Seconds clients should wait before polling an ungraded submission again
+GRADING_RETRY_AFTER = '2'
 
 class CourseViewSet(viewsets.ModelViewSet):
     queryset = Course.objects.filter(is_published=True)
@@ -33,32 +49,82 @@ class CourseViewSet(viewsets.ModelViewSet):
         if level:
             queryset = queryset.filter(level=level)
         if search:
-            queryset = queryset.filter(title__icontains=search)
+            queryset = search_courses(queryset, search)
+
+        if self.action in ('list', 'retrieve'):
+            # Only the columns and joins the requested fields need, plus the
+            # list ordering and the detail ETag
+            serializer = self.get_serializer_class()(context={'request': self.request})
+            queryset = serializer.optimize_queryset(
+                queryset, extra_columns=('created_at', 'updated_at')
+            )
+            if 'view_count' in serializer.fields:
+                queryset = queryset.annotate(view_total=Count('views'))
 
         return queryset
 
+    def get_serializer_class(self):
+        # Compact rows for the catalog, unless the client picks its own fields
+        if self.action == 'list' and 'fields' not in self.request.query_params:
+            return CourseListSerializer
+        # Counters are left out of the cacheable detail and served by stats
+        if self.action == 'retrieve':
+            return CourseDetailSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            # One query for all enrollment flags instead of one per course
+            context['enrolled_course_ids'] = set(
+                Enrollment.objects.filter(user=self.request.user).values_list('course_id', flat=True)
+            )
+        return context
+
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
-        serializer = self.get_serializer(instance)
+        context = self.get_serializer_context()
         
-        # Record course view
-        CourseView.objects.create(
-            course=instance,
-            user=request.user if request.user.is_authenticated else None,
-            ip_address=request.META.get('REMOTE_ADDR')
+        # Record course view; written to the database by the background flusher
+        course_view_buffer.record(
+            instance.id,
+            user_id=request.user.id if request.user.is_authenticated else None
         )
-        
-        return Response(serializer.data)
+
+        # The payload only changes with the course row and the caller's
+        # enrollment, so those make up the validator.
+        is_enrolled = instance.id in context.get('enrolled_course_ids', ())
+        etag = f"course-{instance.id}-{instance.updated_at.timestamp()}-{int(is_enrolled)}"
+        response = not_modified(request, etag, private=True)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer_class()(instance, context=context)
+        return with_validators(Response(serializer.data), etag, private=True)
 
     @action(detail=False, methods=['get'])
     def popular(self, request):
-        # Get most viewed courses in the last 30 days
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        popular_courses = Course.objects.filter(
-            views__viewed_at__gte=thirty_days_ago
-        ).annotate(
-            view_count=Count('views')
-        ).order_by('-view_count')[:6]
+        # Most viewed courses, read from the precomputed rolling windows
+        window = request.query_params.get('window', DEFAULT_WINDOW)
+        if window not in WINDOWS:
+            return Response(
+                {'error': f"window must be one of: {', '.join(WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 6)), 50))
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        popular_courses = top_courses(
+            window=window,
+            category=request.query_params.get('category'),
+            limit=limit
+        )
         
         serializer = self.get_serializer(popular_courses, many=True)
         return Response(serializer.data)
@@ -71,43 +137,13 @@ class CourseViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        # Get user's viewed courses
-        user_views = CourseView.objects.filter(
-            user=request.user
-        ).select_related('course').order_by('-viewed_at')[:10]
-
-        # Get user's interests and learning history
-        user_interests = request.user.interests
-        learning_history = [
-            {
-                'id': view.course.id,
-                'title': view.course.title,
-                'category': view.course.category,
-                'tags': view.course.tags
-            }
-            for view in user_views
-        ]
-
-        # Get available courses (excluding viewed ones)
-        viewed_course_ids = [view.course.id for view in user_views]
-        available_courses = Course.objects.filter(
-            is_published=True
-        ).exclude(
-            id__in=viewed_course_ids
-        ).values('id', 'title', 'category', 'tags')
-
-        # Get AI recommendations
-        recommended_courses = get_course_recommendations(
-            user_interests=user_interests,
-            learning_history=learning_history,
-            available_courses=list(available_courses)
-        )
+        recommended_courses = cached_course_recommendations(request.user)
 
         # Get recommended course objects
         recommended_course_ids = [rec['course_id'] for rec in recommended_courses]
         courses = Course.objects.filter(id__in=recommended_course_ids)
         
-        # Sort courses according to AI recommendations
+        # Keep the recommendation order
         course_dict = {course.id: course for course in courses}
         sorted_courses = [
             course_dict[rec['course_id']]
@@ -118,35 +154,116 @@ class CourseViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(sorted_courses, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        # Closest courses by title, description, category and tags
+        course = self.get_object()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 6)), 50))
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        similar = similar_courses([course.id], limit=limit)
+        serializer = CourseListSerializer(
+            [similar_course for similar_course, _ in similar],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        # View counters, kept out of the cached course detail
+        course = self.get_object()
+        return Response({
+            'views_count': course.views_count,
+            'view_count': course.views.count(),
+        })
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        # Per-category and per-level counts under the current filters and search
+        filters = {
+            name: request.query_params.get(name)
+            for name in ('category', 'level', 'search')
+        }
+        return Response(course_facets(self.get_queryset, filters))
+
     @action(detail=False, methods=['get'])
     def categories(self, request):
+        version = catalog_version()
+        etag = f"categories-{version}"
+        response = not_modified(request, etag, version)
+        if response is not None:
+            return response
+
         categories = Course.objects.values_list('category', flat=True).distinct()
-        return Response(list(categories))
+        return with_validators(Response(list(categories)), etag, version)
 
     @action(detail=False, methods=['get'])
     def levels(self, request):
+        version = catalog_version()
+        etag = f"levels-{version}"
+        response = not_modified(request, etag, version)
+        if response is not None:
+            return response
+
         levels = Course.objects.values_list('level', flat=True).distinct()
-        return Response(list(levels))
+        return with_validators(Response(list(levels)), etag, version)
 
     @action(detail=True, methods=['post'])
     def view(self, request, pk=None):
         course = self.get_object()
         duration = request.data.get('duration', None)
+        if duration is not None:
+            duration = serializers.DurationField().to_internal_value(duration)
         
-        # Create or update course view
-        course_view, created = CourseView.objects.get_or_create(
-            user=request.user,
-            course=course,
-            defaults={'duration': duration}
-        )
-        
-        if not created and duration:
-            course_view.duration = duration
-            course_view.save()
+        # Create or update course view in a single upsert
+        course_view, = record_view_durations(request.user.id, {course.id: duration})
+        if duration is None:
+            course_view = CourseView.objects.get(user=request.user, course=course)
         
         serializer = CourseViewSerializer(course_view)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[permissions.IsAuthenticated],
+        authentication_classes=[BeaconJWTAuthentication],
+        parser_classes=[JSONParser, BeaconJSONParser],
+    )
+    def beacon(self, request):
+        """
+        Record many (course_id, duration) heartbeats at once.
+
+        Accepts navigator.sendBeacon payloads: a text/plain JSON body, with
+        the access token in a ``token`` field.
+        """
+        serializer = ViewBeaconSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        # Keep the longest duration per course; a row can only be upserted once
+        durations = {}
+        for event in serializer.validated_data['events']:
+            course_id = event['course_id']
+            durations[course_id] = max(durations.get(course_id, 0), event['duration'])
+
+        published = set(
+            Course.objects.filter(id__in=durations, is_published=True).values_list('id', flat=True)
+        )
+        record_view_durations(request.user.id, {
+            course_id: timedelta(seconds=seconds)
+            for course_id, seconds in durations.items()
+            if course_id in published
+        })
+
+        return Response({'recorded': len(published)}, status=status.HTTP_200_OK)
+
 class TestViewSet(viewsets.ModelViewSet):
     queryset = Test.objects.all()
     serializer_class = TestSerializer
@@ -156,6 +273,30 @@ class TestViewSet(viewsets.ModelViewSet):
         course_id = self.kwargs.get('course_pk')
         return Test.objects.filter(course_id=course_id)
 
+    def retrieve(self, request, *args, **kwargs):
+        # Validators come from a single indexed lookup, before any questions load
+        try:
+            stamp = self.get_queryset().filter(pk=kwargs['pk']).values_list(
+                'updated_at', 'version'
+            ).first()
+        except (TypeError, ValueError):
+            stamp = None
+        if stamp is None:
+            return Response({'error': 'Test not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        updated_at, version = stamp
+        etag = f"test-{kwargs['pk']}-{version}-{updated_at.timestamp()}"
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+
+        # The payload is the same for every student, so it is rendered once per version
+        response = HttpResponse(
+            test_payload(kwargs['pk'], version, updated_at),
+            content_type='application/json'
+        )
+        return with_validators(response, etag, updated_at)
+
     @action(detail=True, methods=['post'])
     def submit(self, request, course_pk=None, pk=None):
         test = self.get_object()
@@ -164,43 +305,33 @@ class TestViewSet(viewsets.ModelViewSet):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             
-        # Create test submission
-        submission = TestSubmission.objects.create(
-            test=test,
-            user=request.user,
-            status='pending'
-        )
-        
-        # Create question submissions
-        for q_submission in serializer.validated_data['question_submissions']:
-            question = get_object_or_404(Question, id=q_submission['question_id'])
-            
-            question_submission = QuestionSubmission.objects.create(
-                submission=submission,
-                question=question,
-                answer_text=q_submission.get('answer_text', ''),
-                selected_choices=Choice.objects.filter(
-                    id__in=q_submission.get('selected_choice_ids', [])
+        try:
+            with transaction.atomic():
+                submission = create_test_submission(
+                    test,
+                    request.user,
+                    serializer.validated_data['question_submissions']
                 )
-            )
-        
-        # Evaluate submission using AI
-        evaluation_result = evaluate_test_submission(submission)
-        
-        # Update submission with results
-        submission.score = evaluation_result['score']
-        submission.status = 'graded' if evaluation_result['passed'] else 'failed'
-        submission.ai_feedback = evaluation_result['feedback']
-        submission.ai_score = evaluation_result['ai_score']
-        submission.save()
-        
-        # Award rewards
-        rewards = award_rewards(submission)
+                
+                # Graded off the request; clients poll the status URL for results
+                enqueue_grading(submission)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'submission': TestSubmissionSerializer(submission).data,
-            'rewards': UserRewardSerializer(rewards, many=True).data
-        })
+        submission = TestSubmission.objects.prefetch_related(
+            'question_submissions__selected_choices'
+        ).get(id=submission.id)
+        status_url = request.build_absolute_uri(
+            reverse('test-submission-detail', args=[submission.id])
+        )
+        return Response(
+            {
+                'submission': TestSubmissionSerializer(submission).data,
+                'status_url': status_url
+            },
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': status_url, 'Retry-After': GRADING_RETRY_AFTER}
+        )
 
     @action(detail=True, methods=['get'])
     def results(self, request, course_pk=None, pk=None):
@@ -218,6 +349,57 @@ class TestViewSet(viewsets.ModelViewSet):
             
         return Response(TestSubmissionSerializer(submission).data)
 
+class TestSubmissionViewSet(viewsets.ReadOnlyModelViewSet):
+    """The user's own submissions; poll a submission until it leaves pending/grading."""
+    serializer_class = TestSubmissionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-submitted_at', '-id')
+
+    def get_queryset(self):
+        return TestSubmission.objects.filter(user=self.request.user).prefetch_related(
+            'question_submissions__selected_choices'
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        submission = self.get_object()
+        if submission.status in ('pending', 'grading'):
+            return Response(
+                {'submission': self.get_serializer(submission).data, 'rewards': []},
+                headers={'Retry-After': GRADING_RETRY_AFTER}
+            )
+
+        rewards = UserReward.objects.filter(test_submission=submission)
+        return Response({
+            'submission': self.get_serializer(submission).data,
+            'rewards': UserRewardSerializer(rewards, many=True).data
+        })
+
+class PointsLeaderboardViewSet(viewsets.ViewSet):
+    """Users ranked by points: ?window=all|7d|30d, ?course=<id>, ?limit=N."""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        window = request.query_params.get('window', ALL_TIME)
+        if window not in POINTS_WINDOWS:
+            return Response(
+                {'error': f"window must be one of: {', '.join(POINTS_WINDOWS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        course_id = request.query_params.get('course')
+        if course_id is not None:
+            try:
+                course_id = int(course_id)
+            except ValueError:
+                return Response({'error': 'course must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(points_leaderboard(window, course_id, limit, request.user))
+
 class QuestionViewSet(viewsets.ModelViewSet):
     queryset = Question.objects.all()
     serializer_class = QuestionSerializer
@@ -239,6 +421,7 @@ class ChoiceViewSet(viewsets.ModelViewSet):
 class UserRewardViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = UserRewardSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-awarded_at', '-id')
 
     def get_queryset(self):
         return UserReward.objects.filter(user=self.request.user)
@@ -246,11 +429,8 @@ class UserRewardViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def recommendations(self, request):
         """Get AI-powered course recommendations for the user."""
-        # Get user's test submissions
-        test_submissions = TestSubmission.objects.filter(user=request.user)
-        
-        # Get recommendations using AI
-        recommendations = get_course_recommendations(request.user, test_submissions)
+        # Get recommendations using AI, taking the user's test submissions into account
+        recommendations = cached_course_recommendations(request.user, with_tests=True)
         
         return Response(recommendations)
 
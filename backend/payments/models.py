@@ -35,7 +35,7 @@ class Payment(models.Model):
 
     class Meta:
         app_label = 'payments'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
 
 class PaymentAttempt(models.Model):
     payment = models.ForeignKey(Payment, on_delete=models.CASCADE)
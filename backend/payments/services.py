@@ -1,12 +1,9 @@
-from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
-import openai
 from typing import Dict, Any, Optional
 from .models import Payment, UserDiscount
 from accounts.models import User
-
-openai.api_key = settings.OPENAI_API_KEY
+from courses.llm import chat_completion
 
 def analyze_payment_fraud(payment_data: Dict[str, Any]) -> float:
     """
@@ -34,9 +31,8 @@ def analyze_payment_fraud(payment_data: Dict[str, Any]) -> float:
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are a payment fraud detection system."},
                 {"role": "user", "content": prompt}
             ],
@@ -45,7 +41,7 @@ def analyze_payment_fraud(payment_data: Dict[str, Any]) -> float:
         )
         
         # Parse the response to get the fraud score
-        fraud_score = float(response.choices[0].message.content.strip())
+        fraud_score = float(response.strip())
         return min(max(fraud_score, 0), 1)  # Ensure score is between 0 and 1
         
     except Exception as e:
@@ -89,9 +85,8 @@ def recommend_discount(user: User, course: Any) -> Optional[Dict[str, Any]]:
     """
     
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
+        response = chat_completion(
+            [
                 {"role": "system", "content": "You are a discount recommendation system."},
                 {"role": "user", "content": prompt}
             ],
@@ -100,7 +95,7 @@ def recommend_discount(user: User, course: Any) -> Optional[Dict[str, Any]]:
         )
         
         # Parse the response
-        recommendation = response.choices[0].message.content
+        recommendation = response
         # TODO: Parse the JSON response and return the recommendation
         
         return {
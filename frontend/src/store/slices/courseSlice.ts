@@ -62,8 +62,12 @@ export const fetchCourseDetails = createAsyncThunk(
   'courses/fetchCourseDetails',
   async (courseId: number, { rejectWithValue }) => {
     try {
-      const response = await api.get(`/api/courses/${courseId}/`);
-      return response.data;
+      // View counters come from their own endpoint so the detail stays cacheable
+      const [response, stats] = await Promise.all([
+        api.get(`/api/courses/${courseId}/`),
+        api.get(`/api/courses/${courseId}/stats/`),
+      ]);
+      return { ...response.data, ...stats.data };
     } catch (error: any) {
       return rejectWithValue(error.response?.data || 'Failed to fetch course details');
     }